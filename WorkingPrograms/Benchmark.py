@@ -0,0 +1,474 @@
+import os
+import sys
+import json
+import time
+import zlib      #a seed from the search text that is the same in every process
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess   #only to stamp the results with the current commit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler   #the fixture server, one thread per request like a real server
+from urllib.parse import urlparse, parse_qs, unquote_plus
+import numpy as np
+from openlocationcode import openlocationcode as olc
+try:
+    import resource   #peak memory, not available on Windows
+except ImportError:
+    resource = None
+import WebScrapingFramework as scraper
+import Location
+from ResponseParser import PLACE_PATHS
+from Tiling import RESULT_CAP
+from Storage import QueryStore, DedupeIndex
+
+# Offline benchmarks: how fast the scraper goes through a results list, and how fast Location.locations() and
+# load_existing_data() go through a file. The scraper runs against MapsFixture, a local server that imitates the bits
+# of Google Maps the scraper relies on (search box, results feed loaded in batches while scrolling, listing anchors,
+# result cards, detail pane, search responses, tile urls) plus a Nominatim stand-in, all with a configurable latency.
+# The results are saved as JSON, so two commits can be compared with --compare.
+
+LOCALITY = 'Testville'
+CENTER = (45.4642, 9.1900)
+
+
+# --- Fixture data ---
+def make_places(count: int, center: tuple = CENTER, spread_km: float = 5.0, seed: int = 0) -> list[dict]:
+    """count fake places around center, with every field the scraper reads"""
+    rng = random.Random(seed)
+    categories = ['Restaurant', 'Pizza restaurant', 'Cafe', 'Bakery', 'Bar']
+    places = []
+    for number in range(count):
+        lat = center[0] + rng.gauss(0, spread_km / 111.32 / 2)
+        lng = center[1] + rng.gauss(0, spread_km / 111.32 / 2 / np.cos(np.radians(center[0])))
+        places.append({
+            'place_id': f"0x{rng.getrandbits(60):x}:0x{rng.getrandbits(60):x}",
+            'name': f"Fixture Place {number}",
+            'address': f"Via Fixture {number + 1}, {LOCALITY}",
+            'domain': f"fixture-place-{number}.example",
+            'phone_number': f"+39 02 {rng.randrange(1000000, 9999999)}",
+            'category': rng.choice(categories),
+            'reviews_average': round(rng.uniform(3, 5), 1),
+            'reviews_count': rng.randrange(1, 5000),
+            'latitude': lat,
+            'longitude': lng,
+            'plus_code': f"{olc.shorten(olc.encode(lat, lng), center[0], center[1])} {LOCALITY}",
+        })
+    return places
+
+
+def place_record(place: dict) -> list:
+    """a place in the nested list format of the search responses (the inverse of ResponseParser.parse_place)"""
+    record = []
+    for name, path in PLACE_PATHS.items():
+        node = record
+        for depth, step in enumerate(path):
+            node.extend([None] * (step + 1 - len(node)))
+            if depth == len(path) - 1:
+                node[step] = place[name]
+            else:
+                if node[step] is None:
+                    node[step] = []
+                node = node[step]
+    return record
+
+
+def in_view(places: list[dict], lat: float, lng: float, zoom: int, width: int, height: int) -> list[dict]:
+    """the places inside the viewport of a tile url (the same web mercator sizes as Tiling.Tile.zoom)"""
+    lng_span = 360 * width / (256 * 2 ** zoom)
+    lat_span = 360 * height / (256 * 2 ** zoom) * np.cos(np.radians(lat))
+    return [place for place in places
+            if abs(place['latitude'] - lat) <= lat_span / 2 and abs(place['longitude'] - lng) <= lng_span / 2]
+
+
+# --- Fixture page ---
+#only what the scraper looks at: input[name="q"], the feed with the /maps/place anchors and the cards, the detail pane
+_PAGE = """<!doctype html>
+<html><head><meta charset="utf-8"><title>Maps fixture</title>
+<style>
+body { margin: 0; font-family: sans-serif; display: flex; height: 100vh; }
+#side { width: 400px; display: flex; flex-direction: column; border-right: 1px solid #ccc; }
+#feed { flex: 1; overflow-y: auto; }
+.card { position: relative; height: 110px; padding: 8px; border-bottom: 1px solid #eee; box-sizing: border-box; }
+.card a { position: absolute; inset: 0; }
+#pane { flex: 1; padding: 16px; overflow: auto; }
+</style></head>
+<body>
+<div id="side"><input name="q" aria-label="Search"><div id="feed" role="feed"></div></div>
+<div id="pane"></div>
+<script>
+const PATHS = __PATHS__;
+const BATCH = __BATCH__;
+const dig = (record, path) => path.reduce((node, step) => (Array.isArray(node) && node[step] != null) ? node[step] : null, record);
+const field = (record, name) => dig(record, PATHS[name]);
+const parse = (text) => JSON.parse(text.slice(text.indexOf('\\n') + 1));   // drops the )]}' line
+const feed = document.getElementById('feed');
+const pane = document.getElementById('pane');
+const input = document.querySelector('input[name="q"]');
+let query = null, view = '', offset = 0, loading = false, ended = false;
+
+function card(record) {
+    const div = document.createElement('div');
+    div.className = 'card';
+    const name = field(record, 'name');
+    div.innerHTML = `<div class="fontHeadlineSmall">${name}</div>
+        <span class="MW4etd">${field(record, 'reviews_average')}</span> <span class="UY7F9">(${field(record, 'reviews_count').toLocaleString('en-US')})</span>
+        <div>${field(record, 'category')}</div>`;
+    const anchor = document.createElement('a');
+    anchor.href = `https://www.google.com/maps/place/${encodeURIComponent(name)}/data=!4m7!3m6!1s${field(record, 'place_id')}`
+        + `!8m2!3d${field(record, 'latitude')}!4d${field(record, 'longitude')}`;
+    anchor.setAttribute('aria-label', name);
+    anchor.dataset.id = field(record, 'place_id');
+    div.appendChild(anchor);
+    return div;
+}
+
+async function loadBatch() {
+    if (loading || ended || query === null) return;
+    loading = true;
+    const response = await fetch(`/maps/search?tbm=map&q=${encodeURIComponent(query)}&offset=${offset}${view}`);
+    const records = parse(await response.text());
+    for (const record of records) feed.appendChild(card(record));
+    offset += records.length;
+    if (records.length < BATCH) {
+        ended = true;
+        feed.insertAdjacentHTML('beforeend', '<p>You\\'ve reached the end of the list.</p>');
+    }
+    loading = false;
+}
+
+function nearBottom() {
+    return feed.scrollTop + feed.clientHeight >= feed.scrollHeight - 300;
+}
+
+function startSearch(text, viewParams) {
+    query = text; view = viewParams; offset = 0; ended = false;
+    feed.innerHTML = '';
+    loadBatch();
+}
+
+function showPlace(record) {
+    const domain = field(record, 'domain'), phone = field(record, 'phone_number');
+    pane.innerHTML = `<h1 class="DUwDvf">${field(record, 'name')}</h1>
+        <div jsaction="pane.reviewChart.moreReviews"><div role="img" aria-label="${field(record, 'reviews_average')} stars"></div>
+            <span>${field(record, 'reviews_count').toLocaleString('en-US')} reviews</span></div>
+        <button jsaction="pane.place.category"><div class="fontBodyMedium">${field(record, 'category')}</div></button>
+        <button data-item-id="address"><div class="fontBodyMedium">${field(record, 'address')}</div></button>
+        <a data-item-id="authority" href="https://www.${domain}"><div class="fontBodyMedium">${domain}</div></a>
+        <button data-item-id="phone:tel:${phone.replace(/ /g, '')}"><div class="fontBodyMedium">${phone}</div></button>
+        <button data-item-id="oloc"><div class="fontBodyMedium">${field(record, 'plus_code')}</div></button>`;
+}
+
+input.addEventListener('keydown', (event) => { if (event.key === 'Enter') startSearch(input.value, ''); });
+feed.addEventListener('scroll', () => { if (nearBottom()) loadBatch(); });
+feed.addEventListener('wheel', () => { if (nearBottom()) loadBatch(); });
+feed.addEventListener('click', async (event) => {
+    const anchor = event.target.closest('.card')?.querySelector('a');
+    if (!anchor) return;
+    event.preventDefault();   // the anchors point to google.com, the detail comes from the fixture instead
+    const response = await fetch(`/maps/preview/place?id=${encodeURIComponent(anchor.dataset.id)}`);
+    showPlace(parse(await response.text()));
+});
+
+// tile urls: /maps/search/<term>/@lat,lng,zoomz search straight away inside that viewport
+const tile = location.pathname.match(/\\/search\\/([^/]+)\\/@([-\\d.]+),([-\\d.]+),(\\d+)z/);
+if (tile) {
+    input.value = decodeURIComponent(tile[1].replace(/\\+/g, ' '));
+    startSearch(input.value, `&center=${tile[2]},${tile[3]}&zoom=${tile[4]}&width=${innerWidth}&height=${innerHeight}`);
+}
+</script>
+</body></html>
+"""
+
+
+class MapsFixture:
+    """Local stand-in for Google Maps (and Nominatim), on 127.0.0.1 in a background thread.
+
+    latency/jitter (ms) delay every search batch, detail and geocoding response; batch is the number of results
+    per scroll, cap the most results a search returns (like Maps' ~120).
+    Usage: with MapsFixture(places) as fixture: ... fixture.url is the page to give to the scraper (-u).
+    """
+    def __init__(self, places: list[dict], latency: float = 150, jitter: float = 50, batch: int = 20,
+                 cap: int = RESULT_CAP, port: int = 0):
+        self.places = places
+        self.by_id = {place['place_id']: place for place in places}
+        self.latency = latency
+        self.jitter = jitter
+        self.batch = batch
+        self.cap = cap
+        self.page = _PAGE.replace('__PATHS__', json.dumps(PLACE_PATHS)).replace('__BATCH__', str(batch)).encode('utf-8')
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    @property
+    def url(self) -> str:
+        return f"{self.base_url}/maps"
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)) / 1000)
+
+    def results(self, params: dict) -> list[dict]:
+        """the places a search returns, before the batching: the ones in the tile's viewport if there is one, at most cap.
+        Without a tile every query gets its own places (the same ones every time it's asked), as on Maps."""
+        places = self.places
+        if 'center' in params:
+            lat, lng = (float(value) for value in params['center'][0].split(','))
+            places = in_view(places, lat, lng, int(params['zoom'][0]), int(params['width'][0]), int(params['height'][0]))
+        else:
+            rng = random.Random(zlib.crc32(params.get('q', [''])[0].encode('utf-8')))
+            places = rng.sample(places, len(places))
+        return places[:self.cap]
+
+    def _handler(self):
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass   # one line per request would drown the scraper's output
+
+            def send(self, body: bytes, content_type: str, status: int = 200):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_records(self, payload):
+                self.send((")]}'\n" + json.dumps(payload)).encode('utf-8'), 'application/json; charset=utf-8')
+
+            def do_GET(self):
+                fixture.requests += 1
+                url = urlparse(self.path)
+                params = parse_qs(url.query)
+                if url.path == '/maps/search' and 'tbm' in params:      # one batch of the results feed
+                    fixture.delay()
+                    offset = int(params.get('offset', ['0'])[0])
+                    self.send_records([place_record(place) for place in fixture.results(params)[offset:offset + fixture.batch]])
+                elif url.path == '/maps/preview/place':                 # the detail pane of a listing
+                    fixture.delay()
+                    place = fixture.by_id.get(params.get('id', [''])[0])
+                    if place:
+                        self.send_records(place_record(place))
+                    else:
+                        self.send(b'not found', 'text/plain', 404)
+                elif url.path == '/maps' or url.path.startswith('/maps/'):   # the page itself, also for the tile urls
+                    self.send(fixture.page, 'text/html; charset=utf-8')
+                elif url.path == '/search':                             # Nominatim: only knows the fixture's locality
+                    fixture.delay()
+                    query = unquote_plus(params.get('q', [''])[0])
+                    lat, lng = CENTER
+                    found = [{'place_id': 1, 'lat': str(lat), 'lon': str(lng), 'display_name': LOCALITY,
+                              'boundingbox': [str(lat - 0.05), str(lat + 0.05), str(lng - 0.07), str(lng + 0.07)]}]
+                    self.send(json.dumps(found if LOCALITY.lower() in query.lower() else []).encode('utf-8'), 'application/json')
+                else:
+                    self.send(b'not found', 'text/plain', 404)
+
+        return Handler
+
+
+# --- Measurements ---
+def peak_rss_mb() -> dict:
+    """peak resident memory of this process and of the largest child that has exited (chromium), in MB"""
+    if resource is None:
+        return {}
+    scale = 1 if sys.platform == 'darwin' else 1024   #bytes on macOS, KB on Linux
+    return {'self': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1_048_576,
+            'children': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1_048_576}
+
+
+def percentiles(values: list, points: tuple = (50, 90, 99)) -> dict:
+    if not values:
+        return {}
+    return {f"p{point}": float(np.percentile(values, point)) for point in points} | {'max': float(max(values))}
+
+
+def bench_scrape(fixture: MapsFixture, searches: int = 1, workers: int = 1, profile: str = 'lean', engine: str = 'click',
+                 fixed_waits: bool = False, work_dir: str = None, use_store: bool = True, skip_known: bool = False) -> dict:
+    """Scrapes the fixture with run() the way the CLI does, with a store and a dedupe index (fresh ones in work_dir,
+    where the exports go too). use_store=False leaves both out, to measure the bare scraping.
+    skip_known=False by default: every listing is scraped, so the searches that share places with an earlier one
+    don't make the numbers look better than they are. With skip_known the listings the index already had are
+    timed apart ('known_latency_ms'), the rest are 'listing_latency_ms'."""
+    work_dir = work_dir or tempfile.mkdtemp()
+    scraper.BusinessList.save_at = work_dir   #the exports must not end up in GMaps Data
+    store = QueryStore(os.path.join(work_dir, scraper.STORE_FILENAME)) if use_store else None
+    index = DedupeIndex(os.path.join(work_dir, 'dedupe_index.sqlite')) if use_store else None
+    search_list = [f"fixture search {number} in {LOCALITY}" for number in range(searches)]
+    started = time.perf_counter()
+    try:
+        summaries = asyncio.run(scraper.run(search_list, 1_000_000, workers=workers, url=fixture.url, profile=profile,
+                                            waits=scraper.WaitEngine(fixed=fixed_waits), engine=engine, store=store, index=index,
+                                            skip_known=skip_known))
+    finally:
+        if store:
+            store.close()
+            index.close()
+    seconds = time.perf_counter() - started
+    listings = sum(summary.get('listings', 0) for summary in summaries)
+    metrics = scraper.RunMetrics()
+    waits = {}
+    for summary in summaries:
+        metrics.merge(summary['metrics'])
+        scraper._merge_waits(waits, summary.get('waits', {}))
+    latencies = metrics.durations.get('listing', [])
+    known = metrics.durations.get('listing_known', [])   #only with skip_known: reused from the index, no click
+    return {'searches': len(summaries), 'failed_searches': searches - len(summaries), 'store': use_store,
+            'listings': listings, 'seconds': seconds,
+            'listings_per_sec': listings / seconds if seconds else 0.0,
+            'listing_latency_ms': {key: value * 1000 for key, value in percentiles(latencies).items()},
+            'scraped_per_sec': len(latencies) / seconds if seconds else 0.0,
+            'known_latency_ms': {key: value * 1000 for key, value in percentiles(known).items()},
+            'skip_known': skip_known,
+            'clicks': sum(summary.get('clicks', 0) for summary in summaries),
+            'from_responses': sum(summary.get('from_responses', 0) for summary in summaries),
+            'clicks_avoided': sum(summary.get('clicks_avoided', 0) for summary in summaries),
+            'waits': waits, 'stages': metrics.summary()['stages'], 'peak_rss_mb': peak_rss_mb()}
+
+
+def bench_locations(fixture: MapsFixture, rows: int, work_dir: str) -> dict:
+    """Location.locations() on a csv of rows plus codes, 80% short ones with the locality (geocoded through the fixture)"""
+    rng = random.Random(1)
+    codes = []
+    for _ in range(rows):
+        lat, lng = CENTER[0] + rng.uniform(-0.05, 0.05), CENTER[1] + rng.uniform(-0.07, 0.07)
+        code = olc.encode(lat, lng)
+        codes.append(f"{olc.shorten(code, *CENTER)} {LOCALITY}" if rng.random() < 0.8 else code)
+    path = os.path.join(work_dir, 'bench_locations.csv')
+    Location.pd.DataFrame({'name': [f"row {number}" for number in range(rows)], 'plus_code': codes}).to_csv(path, index=False)
+    geocoder = Location.make_geocoder(cache_path=os.path.join(work_dir, 'geocode_cache.sqlite'), rate=100,
+                                      domain=fixture.base_url.split('://')[1], scheme='http')
+    started = time.perf_counter()
+    Location.locations(path, geocoder=geocoder)
+    seconds = time.perf_counter() - started
+    geocoder.cache.close()
+    return {'rows': rows, 'seconds': seconds, 'rows_per_sec': rows / seconds if seconds else 0.0}
+
+
+def bench_load_existing(places: list[dict], rows: int, work_dir: str) -> dict:
+    """load_existing_data() on a csv of rows businesses, as written by the scraper's export"""
+    businesses = [scraper.Business(**{key: value for key, value in places[number % len(places)].items() if key != 'place_id'})
+                  for number in range(rows)]
+    scraper.BusinessList(businesses).dataframe().to_csv(os.path.join(work_dir, 'bench_load.csv'), index=False)
+    started = time.perf_counter()
+    loaded = scraper.load_existing_data('bench_load', work_dir)
+    seconds = time.perf_counter() - started
+    return {'rows': len(loaded), 'seconds': seconds, 'rows_per_sec': len(loaded) / seconds if seconds else 0.0}
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+#the numbers worth comparing between two result files, and whether higher is better
+COMPARED = [('scrape', 'listings_per_sec', True), ('scrape', 'listing_latency_ms.p50', False),
+            ('scrape', 'listing_latency_ms.p90', False), ('scrape', 'peak_rss_mb.self', False),
+            ('locations', 'rows_per_sec', True), ('load_existing_data', 'rows_per_sec', True)]
+
+
+def compare(previous: dict, current: dict):
+    print(f"\n--- {previous.get('commit')} -> {current.get('commit')} ---")
+    for section, path, higher_is_better in COMPARED:
+        old, new = previous.get(section), current.get(section)
+        for key in path.split('.'):
+            old = old.get(key) if isinstance(old, dict) else None
+            new = new.get(key) if isinstance(new, dict) else None
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        better = (change > 0) == higher_is_better
+        print(f"{section}.{path}: {old:.2f} -> {new:.2f} ({change:+.1%}{'' if abs(change) < 0.05 else ', better' if better else ', worse'})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the scraper (on a local Maps fixture), Location.py and the csv loading")
+    parser.add_argument("--places", type=int, default=200, help="Places known to the fixture")
+    parser.add_argument("--latency", type=float, default=150, help="ms the fixture takes to answer a batch, a detail or a geocoding request")
+    parser.add_argument("--jitter", type=float, default=50, help="± ms around --latency")
+    parser.add_argument("--batch", type=int, default=20, help="Results added to the feed by every scroll")
+    parser.add_argument("--cap", type=int, default=RESULT_CAP, help="Most results a search returns")
+    parser.add_argument("--searches", type=int, default=1, help="Searches scraped")
+    parser.add_argument("-w", "--workers", type=int, default=1)
+    parser.add_argument("-p", "--profile", choices=list(scraper.BROWSER_PROFILES), default="lean")
+    parser.add_argument("-e", "--engine", choices=["click", "network"], default="click")
+    parser.add_argument("--fixed-waits", action="store_true")
+    parser.add_argument("--skip-known", action="store_true",
+                        help="Reuse the places the dedupe index already has instead of clicking them, as the CLI does (timed apart)")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Scrape without the sqlite store and the dedupe index (the CLI always uses both)")
+    parser.add_argument("--rows", type=int, default=50_000, help="Rows of the Location.py and load_existing_data files")
+    parser.add_argument("--skip", default="", help="Comma separated among scrape, locations, load")
+    parser.add_argument("--port", type=int, default=0, help="Fixture port (0: any free one)")
+    parser.add_argument("--serve", action="store_true",
+                        help="Only run the fixture until Ctrl+C, to point the scraper at it by hand (-u <url>)")
+    parser.add_argument("-o", "--output", default=None, help="Results file (default: benchmarks/bench_<date>_<commit>.json)")
+    parser.add_argument("--compare", default=None, metavar="JSON", help="A previous results file to compare against")
+    args = parser.parse_args()
+
+    places = make_places(args.places)
+    skip = {name.strip() for name in args.skip.split(',') if name.strip()}
+    with MapsFixture(places, latency=args.latency, jitter=args.jitter, batch=args.batch, cap=args.cap, port=args.port) as fixture:
+        if args.serve:
+            print(f"Maps fixture on {fixture.url} (Nominatim on {fixture.base_url}), Ctrl+C to stop")
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                sys.exit()
+
+        results = {'commit': current_commit(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                   'python': sys.version.split()[0], 'config': vars(args)}
+        with tempfile.TemporaryDirectory() as work_dir:
+            if 'scrape' not in skip:   #first, so that the peak memory is the scraper's
+                results['scrape'] = bench_scrape(fixture, searches=args.searches, workers=args.workers, profile=args.profile,
+                                                 engine=args.engine, fixed_waits=args.fixed_waits, work_dir=work_dir,
+                                                 use_store=not args.no_store, skip_known=args.skip_known)
+            if 'locations' not in skip:
+                results['locations'] = bench_locations(fixture, args.rows, work_dir)
+            if 'load' not in skip:
+                results['load_existing_data'] = bench_load_existing(places, args.rows, work_dir)
+
+    output = args.output or os.path.join('benchmarks', f"bench_{datetime.date.today().isoformat()}_{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=1)
+
+    print("\n===== Benchmark =====")
+    if 'scrape' in results:
+        scrape = results['scrape']
+        latency = scrape['listing_latency_ms']
+        print(f"Scrape: {scrape['listings']} listings in {scrape['seconds']:.1f}s, {scrape['listings_per_sec']:.2f} listings/s, "
+              f"latency p50 {latency.get('p50', 0):.0f}ms p90 {latency.get('p90', 0):.0f}ms p99 {latency.get('p99', 0):.0f}ms, "
+              f"peak RSS {scrape['peak_rss_mb'].get('self', 0):.0f} MB (largest browser process {scrape['peak_rss_mb'].get('children', 0):.0f} MB)")
+        if scrape['known_latency_ms']:
+            known = scrape['known_latency_ms']
+            print(f"  of which {scrape['clicks_avoided']} reused from the dedupe index (p50 {known.get('p50', 0):.0f}ms, "
+                  f"not in the latency above), {scrape['scraped_per_sec']:.2f} scraped listings/s")
+        if scrape['failed_searches']:
+            print(f"WARNING: {scrape['failed_searches']} of {args.searches} searches failed, the numbers above don't cover them")
+    for section in ('locations', 'load_existing_data'):
+        if section in results:
+            print(f"{section}: {results[section]['rows']} rows in {results[section]['seconds']:.2f}s, {results[section]['rows_per_sec']:,.0f} rows/s")
+    print(f"Saved to {output}")
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
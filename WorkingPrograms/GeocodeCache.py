@@ -0,0 +1,121 @@
+import sqlite3   #the cache survives between runs, one small file
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor   #geopy is blocking, so the lookups run in threads
+
+# Locality -> coordinates, for the reference points of the short plus codes.
+# GeocodeCache keeps every answer on disk (also the "not found" ones, for a shorter time), and Geocoder
+# resolves all the distinct localities of a file in one go: the cached ones straight away, the others
+# concurrently but never faster than the rate the geocoding service allows (Nominatim: 1 request per second).
+
+DAY = 24 * 60 * 60
+
+
+class GeocodeCache:
+    """sqlite cache of geocoded localities, with a time to live for the hits and one for the misses"""
+    def __init__(self, db_path: str, ttl: float = 180 * DAY, negative_ttl: float = 7 * DAY):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # the worker threads only ask, the main thread does all the reads and writes, but sqlite wants to be told
+        # (timeout: in batch mode several processes share the file and may have to wait for each other's writes)
+        self.connection = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS localities (
+                locality TEXT PRIMARY KEY,
+                latitude REAL,
+                longitude REAL,
+                fetched_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+
+    def get_many(self, localities: list) -> dict:
+        """The fresh entries among localities: locality -> (lat, lng), or None for a cached 'not found'."""
+        now = time.time()
+        found = {}
+        for start in range(0, len(localities), 500):   #sqlite has a limit on the number of ? in a query
+            chunk = localities[start:start + 500]
+            rows = self.connection.execute(
+                f"SELECT locality, latitude, longitude, fetched_at FROM localities WHERE locality IN ({','.join('?' * len(chunk))})",
+                chunk)
+            for locality, latitude, longitude, fetched_at in rows:
+                if latitude is None:
+                    if now - fetched_at < self.negative_ttl:
+                        found[locality] = None
+                elif now - fetched_at < self.ttl:
+                    found[locality] = (latitude, longitude)
+        return found
+
+    def put(self, locality: str, coordinates: tuple = None):
+        """Saves an answer, coordinates=None meaning the service didn't find the locality."""
+        latitude, longitude = coordinates if coordinates else (None, None)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO localities (locality, latitude, longitude, fetched_at) VALUES (?, ?, ?, ?)",
+                (locality, latitude, longitude, time.time()))
+
+    def close(self):
+        self.connection.close()
+
+
+class TokenBucket:
+    """At most `rate` acquisitions per second on average, with bursts of up to `capacity`. Thread safe."""
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class Geocoder:
+    """Resolves many localities at once: cache first, then the geolocator (anything with geopy's .geocode)."""
+    def __init__(self, geolocator, cache: GeocodeCache = None, rate: float = 1.0, burst: float = 1, workers: int = 4):
+        self.geolocator = geolocator
+        self.cache = cache
+        self.bucket = TokenBucket(rate, burst)
+        self.workers = workers
+        self.stats = {'localities': 0, 'cached': 0, 'looked_up': 0, 'not_found': 0, 'errors': 0}
+
+    def _lookup(self, locality: str):
+        self.bucket.acquire()
+        location = self.geolocator.geocode(locality)
+        return (location.latitude, location.longitude) if location else None
+
+    def resolve(self, localities) -> dict:
+        """locality -> (lat, lng) for every distinct locality, None for the ones that can't be found."""
+        unique = list(dict.fromkeys(locality for locality in localities if locality))
+        results = self.cache.get_many(unique) if self.cache else {}
+        self.stats['localities'] += len(unique)
+        self.stats['cached'] += len(results)
+        missing = [locality for locality in unique if locality not in results]
+        if missing:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                futures = {locality: pool.submit(self._lookup, locality) for locality in missing}
+                for locality, future in futures.items():
+                    try:
+                        coordinates = future.result()
+                    except Exception as e:
+                        # a timeout or a service error is not an answer: not cached, tried again next run
+                        print(f"❌ Geocoding '{locality}' failed: {e}")
+                        self.stats['errors'] += 1
+                        results[locality] = None
+                        continue
+                    self.stats['looked_up'] += 1
+                    self.stats['not_found'] += coordinates is None
+                    results[locality] = coordinates
+                    if self.cache:
+                        self.cache.put(locality, coordinates)
+        return results
@@ -1,63 +1,337 @@
 import pandas as pd
+import numpy as np
 import argparse
 import os
+import glob
+import json
+import time
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed   #one file per process in batch mode
 from openlocationcode import openlocationcode as olc
 from geopy.geocoders import Nominatim
-import time
+from PlusCodes import decode_batch, verify_against_olc, SHORT_CODE_PATTERN   #decodes the whole column at once
+from GeocodeCache import GeocodeCache, Geocoder, DAY   #persistent locality cache + rate limited concurrent lookups
+
+GEOCODE_CACHE_PATH = os.path.join('GMaps Data', 'geocode_cache.sqlite')
+
+def make_geocoder(cache_path=GEOCODE_CACHE_PATH, ttl_days=180, negative_ttl_days=7, rate=1.0, workers=4,
+                  domain=None, scheme=None) -> Geocoder:
+    """Nominatim behind the on-disk cache. domain/scheme point it to another Nominatim compatible service (e.g. a local stand-in)."""
+#pluscode_decoder is just a name for the user agent to identify the application, could be any string
+    options = {key: value for key, value in (('domain', domain), ('scheme', scheme)) if value}
+    geolocator = Nominatim(user_agent="pluscode_decoder", **options)
+    os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+    cache = GeocodeCache(cache_path, ttl=ttl_days * DAY, negative_ttl=negative_ttl_days * DAY)
+    return Geocoder(geolocator, cache, rate=rate, workers=workers)
 
-def locations(file_path):
-    if os.path.exists(file_path):
-        df = pd.read_excel(file_path)
+def split_plus_codes(plus_codes: pd.Series) -> tuple:
+    """'75WG+R4 Tsim Sha Tsui, Hong Kong' -> ('75WG+R4', 'Tsim Sha Tsui, Hong Kong'), for the whole column at once"""
+    parts = plus_codes.astype(str).str.strip().str.split(n=1, expand=True) #splitting the full string at the first space
+    codes = parts[0].str.strip()
+    localities = parts[1].str.strip() if 1 in parts.columns else pd.Series(None, index=parts.index, dtype=object)
+    return codes, localities
+
+def locations(file_path, check=False, geocoder=None):
+    if not os.path.exists(file_path):
+        print(f"Error: {file_path} doesn't exist")
+        return
+    stem, extension = os.path.splitext(file_path)
+    extension = extension.lower()
+    # the scraper now exports csv by default (parquet and xlsx on request), any of them can be decoded
+    df = pd.read_csv(file_path) if extension == '.csv' else (pd.read_parquet(file_path) if extension == '.parquet' else pd.read_excel(file_path))
 
     if 'plus_code' not in df.columns:
         print("Error: No 'plus_code' column in the file")
         return
-#pluscode_decoder is just a name for the user agent to identify the application, could be any string
-    geolocator = Nominatim(user_agent="pluscode_decoder")
-    city_cache = {}  # Cache coordinates to avoid repeated geocoding
+    for column in ('latitude', 'longitude'):
+        if column not in df.columns:
+            df[column] = np.nan
+
+    # the rows that already have their coordinates are skipped, as before
+    todo = df['plus_code'].notna() & (df['latitude'].isna() | df['longitude'].isna())
+    if todo.any():
+        geocoder = geocoder or make_geocoder()
+        decode_rows(df, todo, check, geocoder)
+        stats = geocoder.stats
+        print(f"Geocoding: {stats['localities']} localities, {stats['cached']} from cache, {stats['looked_up']} looked up "
+              f"({stats['not_found']} not found), {stats['errors']} errors")
 
-    for idx, row in df.iterrows():
-        full_string = str(row['plus_code']).strip() 
-        string_divided = full_string.split(maxsplit=1) #splitting the full string at the first space['75WG+R4', 'Tsim Sha Tsui, Hong Kong']
-        short_code = string_divided[0].strip()
-        location_str = string_divided[1].strip() if len(string_divided) > 1 else None #so string_divided is a list actually, and I am checking its length 
+    # Save updated file, in its own format, and the csv next to it
+    if extension == '.parquet':
+        typed(df).to_parquet(file_path, index=False)
+    elif extension != '.csv':
+        df.to_excel(file_path, index=False)
+    df.to_csv(stem + ".csv", index=False)
 
-        if pd.notna(row['latitude']) and pd.notna(row['longitude']):
-            continue  # skip the rest of the loop for this row and move to the next row
+def decode_rows(df, todo, check=False, geocoder=None):
+    """Fills latitude and longitude of the rows selected by todo (a boolean mask), in place."""
+    codes, localities = split_plus_codes(df.loc[todo, 'plus_code'])
+    geocoder = geocoder or make_geocoder()
 
+    # short codes need a reference point: all the distinct localities are resolved up front, from the cache when possible
+    needs_reference = codes.str.upper().str.match(SHORT_CODE_PATTERN) & localities.notna()
+    city_cache = geocoder.resolve(localities[needs_reference].unique())
+
+    # a locality that can't be found gives NaN, its rows are reported one by one below
+    references = localities.map(lambda location_str: city_cache.get(location_str) or (np.nan, np.nan))
+    ref_lat = references.str[0].to_numpy(dtype=float)
+    ref_lng = references.str[1].to_numpy(dtype=float)
+    latitudes, longitudes, ok = decode_batch(codes, ref_lat, ref_lng)
+
+    # the few codes the batch decoder doesn't take (padded, invalid, short without a reference) go one by one through the library,
+    # which also tells us why they fail
+    for position in np.flatnonzero(~ok):
+        idx, short_code, location_str = codes.index[position], codes.iloc[position], localities.iloc[position]
         try:
             if olc.isFull(short_code):
-                area = olc.decode(short_code) #basically never working because the short code is never going to be be exhaustive
+                area = olc.decode(short_code)
             elif olc.isShort(short_code):
-                if not location_str:
+                if not isinstance(location_str, str) or not location_str:
                     raise ValueError("Short code requires a reference location")
-                if location_str not in city_cache:         #if you already geocoded before 
-                    location = geolocator.geocode(location_str)
-                    if location is None:
-                        raise ValueError(f"Could not geocode '{location_str}'")
-                    ref_lat, ref_lng = location.latitude, location.longitude
-                    city_cache[location_str] = (ref_lat, ref_lng)
-                    time.sleep(1)  # Avoid hitting geocoder rate limits
-
-                full_code = olc.recoverNearest(short_code, ref_lat, ref_lng)
-                area = olc.decode(full_code)
-
+                if np.isnan(ref_lat[position]):
+                    raise ValueError(f"Could not geocode '{location_str}'")
+                area = olc.decode(olc.recoverNearest(short_code, ref_lat[position], ref_lng[position]))
             else:
                 raise ValueError(f"Invalid plus code: {short_code}")
-
-            df.loc[idx, 'latitude'] = area.latitudeCenter
-            df.loc[idx, 'longitude'] = area.longitudeCenter
+            latitudes[position], longitudes[position] = area.latitudeCenter, area.longitudeCenter
         except Exception as e:
             print(f"❌ Row {idx} failed: {e}")
 
-    # Save updated file
-    df.to_excel(file_path, index=False)
-    csv_file_path = os.path.splitext(file_path)[0] + ".csv"
-    df.to_csv(csv_file_path, index=False)
-    
+    if check:
+        mismatches = verify_against_olc(codes, ref_lat, ref_lng)
+        print(f"Checked {int(ok.sum())} codes against openlocationcode: {len(mismatches)} mismatches")
+        for row, code, batch, library in mismatches[:20]:
+            print(f"  row {codes.index[row]} {code}: batch {batch} vs library {library}")
+
+    # one write for the whole block instead of df.loc[idx, ...] row by row (the failed rows are left as they were)
+    decoded = ~np.isnan(latitudes)
+    df.loc[codes.index[decoded], ['latitude', 'longitude']] = np.column_stack([latitudes[decoded], longitudes[decoded]])
+
+# --- Batch mode: a whole folder (or glob) of files ---
+CHUNK_ROWS = 50_000           #csv files are read and decoded this many rows at a time
+INPUT_PREFERENCE = ('.csv', '.parquet', '.xlsx')   #when the same search has several files, the first one found here is read
+MANIFEST_PATH = os.path.join('GMaps Data', 'location_manifest.json')
+
+def typed(df):
+    """Explicit dtypes for the columnar outputs: float64 coordinates and ratings, nullable integer review counts."""
+    df = df.copy()
+    for column in ('latitude', 'longitude', 'reviews_average'):
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    if 'reviews_count' in df.columns:
+        df['reviews_count'] = pd.to_numeric(df['reviews_count'], errors='coerce').round().astype('Int64')
+    return df
+
+MERGED_COLUMNS = {'query', 'date'}   #added by merge_outputs, a search file never has them
+
+def is_merged_output(path):
+    """True for the parquet written by a previous --merge (only its schema is read): it isn't a search to decode again"""
+    if os.path.splitext(path)[1].lower() != '.parquet':
+        return False
+    import pyarrow.parquet as pq   #already needed by pandas to read parquet
+    try:
+        return MERGED_COLUMNS <= set(pq.read_schema(path).names)
+    except Exception:
+        return False   #not readable as parquet: process_file will report it
+
+def find_inputs(target, exclude=()):
+    """Every search file under a folder (recursively) or matching a glob, one per search, csv preferred.
+    The merged parquet of a previous --merge is left out, wherever it was written."""
+    pattern = os.path.join(target, '**', '*') if os.path.isdir(target) else target
+    by_search = {}
+    for path in glob.glob(pattern, recursive=True):
+        stem, extension = os.path.splitext(path)
+        if extension.lower() in INPUT_PREFERENCE and os.path.abspath(path) not in exclude and not is_merged_output(path):
+            by_search.setdefault(stem, []).append(path)
+    return [min(paths, key=lambda path: INPUT_PREFERENCE.index(os.path.splitext(path)[1].lower()))
+            for stem, paths in sorted(by_search.items())]
+
+def is_up_to_date(output, source):
+    """True if output exists and wasn't written before source"""
+    return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(source)
+
+def missing_outputs(path, write_xlsx=False, write_parquet=False):
+    """The .xlsx/.parquet asked for this run that the file doesn't have yet (or that are older than it)"""
+    stem, extension = os.path.splitext(path)
+    wanted = [suffix for suffix, asked in (('.xlsx', write_xlsx), ('.parquet', write_parquet)) if asked and suffix != extension.lower()]
+    return [stem + suffix for suffix in wanted if not is_up_to_date(stem + suffix, path)]
+
+def file_signature(path, previous=None):
+    """mtime and size, plus the sha1 of the content only when they changed (a file touched but not modified stays the same)"""
+    stat = os.stat(path)
+    signature = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if previous and previous.get('mtime_ns') == stat.st_mtime_ns and previous.get('size') == stat.st_size:
+        return {**signature, 'sha1': previous.get('sha1')}
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(block)
+    return {**signature, 'sha1': sha1.hexdigest()}
+
+def _decode_frame(df, check, geocoder):
+    """the same steps as locations() on a frame (or a chunk of one), in place"""
+    for column in ('latitude', 'longitude'):
+        if column not in df.columns:
+            df[column] = np.nan
+    todo = df['plus_code'].notna() & (df['latitude'].isna() | df['longitude'].isna())
+    if todo.any():
+        decode_rows(df, todo, check, geocoder)
+    return df
+
+def process_file(path, check=False, geocoder=None, write_xlsx=False, write_parquet=False) -> dict:
+    """Decodes one file of the batch and rewrites it in place (csv written chunk by chunk to a temporary file, then swapped in).
+    Returns the summary of the file, with 'output' being the file the manifest has to watch."""
+    started = time.perf_counter()
+    geocoder = geocoder or make_geocoder()
+    before = dict(geocoder.stats)
+    stem, extension = os.path.splitext(path)
+    extension = extension.lower()
+    frames = []
+    rows = 0
+    if extension == '.csv':
+        temporary = path + '.tmp'
+        with pd.read_csv(path, chunksize=CHUNK_ROWS) as reader:
+            for number, chunk in enumerate(reader):
+                if 'plus_code' not in chunk.columns:   # only possible on the first chunk, nothing written yet
+                    return {'file': path, 'error': "No 'plus_code' column in the file"}
+                chunk = _decode_frame(chunk, check, geocoder)
+                chunk.to_csv(temporary, index=False, mode='w' if number == 0 else 'a', header=number == 0)
+                rows += len(chunk)
+                if write_xlsx or write_parquet:
+                    frames.append(chunk)
+        os.replace(temporary, path)   # a crash halfway leaves the original file untouched
+        output = path
+    else:
+        df = pd.read_parquet(path) if extension == '.parquet' else pd.read_excel(path)
+        if 'plus_code' not in df.columns:
+            return {'file': path, 'error': "No 'plus_code' column in the file"}
+        df = _decode_frame(df, check, geocoder)
+        rows = len(df)
+        frames.append(df)
+        if extension == '.parquet':
+            typed(df).to_parquet(path, index=False)
+        else:
+            df.to_excel(path, index=False)
+            df.to_csv(stem + '.csv', index=False)   # from now on the csv is the input of this search
+        output = path if extension == '.parquet' else stem + '.csv'
+
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+        if write_xlsx and extension != '.xlsx':
+            df.to_excel(stem + '.xlsx', index=False)
+        if write_parquet and extension != '.parquet':
+            typed(df).to_parquet(stem + '.parquet', index=False)
+
+    geocoding = {key: geocoder.stats[key] - before.get(key, 0) for key in geocoder.stats}
+    return {'file': path, 'output': output, 'rows': rows, 'geocoding': geocoding,
+            'seconds': time.perf_counter() - started}
+
+_worker_geocoder = None
+
+def _init_worker(geocoder_options):
+    """every process of the pool opens its own geocoder (sqlite connections can't be shared between processes)"""
+    global _worker_geocoder
+    _worker_geocoder = make_geocoder(**geocoder_options)
+
+def _process_in_worker(path, options):
+    try:
+        return process_file(path, geocoder=_worker_geocoder, **options)
+    except Exception as e:
+        return {'file': path, 'error': str(e)}
+
+def merge_outputs(paths, merge_path):
+    """All the searches in one typed parquet file, with the search and the date folder it comes from."""
+    frames = []
+    for path in paths:
+        stem = os.path.splitext(path)[0]
+        #the typed parquet is quicker to read, but only if it was written after the decoding (the scraper's -x parquet has no coordinates)
+        source = stem + '.parquet' if is_up_to_date(stem + '.parquet', path) else path
+        df = pd.read_parquet(source) if source.endswith('.parquet') else (pd.read_csv(source) if source.endswith('.csv') else pd.read_excel(source))
+        df['query'] = os.path.basename(stem)
+        df['date'] = os.path.basename(os.path.dirname(path))
+        frames.append(df)
+    merged = typed(pd.concat(frames, ignore_index=True))
+    merged.to_parquet(merge_path, index=False)
+    return len(merged)
+
+def batch_locations(target, processes=None, check=False, write_xlsx=False, write_parquet=False, merge_path=None,
+                    manifest_path=MANIFEST_PATH, force=False, geocoder_options=None):
+    """Decodes every search file under target in a process pool, skipping the ones unchanged since the last run."""
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path) as file:
+            manifest = json.load(file)
+
+    exclude = {os.path.abspath(path) for path in (merge_path,) if path}
+    inputs = find_inputs(target, exclude)
+    todo, skipped = [], []
+    for path in inputs:
+        previous = manifest.get(path)
+        unchanged = previous and file_signature(path, previous)['sha1'] == previous['sha1']
+        if unchanged and not missing_outputs(path, write_xlsx, write_parquet):
+            skipped.append(path)
+        else:
+            todo.append(path)
+    print(f"{len(inputs)} files: {len(todo)} to decode, {len(skipped)} unchanged since the last run")
+
+    processes = max(1, min(processes or os.cpu_count() or 1, len(todo) or 1))
+    geocoder_options = dict(geocoder_options or {})
+    # every process has its own token bucket, so the allowed rate is shared among them
+    geocoder_options['rate'] = geocoder_options.get('rate', 1.0) / processes
+    options = {'check': check, 'write_xlsx': write_xlsx, 'write_parquet': write_parquet}
+    started = time.perf_counter()
+    total_rows = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(geocoder_options,)) as pool:
+        futures = [pool.submit(_process_in_worker, path, options) for path in todo]
+        for future in as_completed(futures):
+            summary = future.result()
+            if 'error' in summary:
+                print(f"❌ {summary['file']} failed: {summary['error']}")
+                continue
+            total_rows += summary['rows']
+            geocoding = summary['geocoding']
+            print(f"✔ {summary['file']}: {summary['rows']} rows in {summary['seconds']:.1f}s "
+                  f"(localities: {geocoding['cached']} cached, {geocoding['looked_up']} looked up)")
+            manifest[summary['file']] = file_signature(summary['output'])
+            if summary['output'] != summary['file']:
+                manifest[summary['output']] = manifest[summary['file']]
+            # written after every file, so an interrupted batch doesn't redo what's done
+            with open(manifest_path, 'w') as file:
+                json.dump(manifest, file, indent=1)
+
+    elapsed = time.perf_counter() - started
+    print(f"Decoded {total_rows} rows in {elapsed:.1f}s with {processes} process(es)")
+    if merge_path:
+        print(f"Merged {merge_outputs(inputs, merge_path)} rows into {merge_path}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Decode Plus Codes automatically")
-    parser.add_argument("-f", "--file", required=True, help="Path to the Excel file containing the plus codes")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("-f", "--file", help="Path to the .csv, .parquet or .xlsx file containing the plus codes")
+    target.add_argument("-b", "--batch", help="A folder (e.g. 'GMaps Data') or a glob ('GMaps Data/2025-12-*/*.csv') to decode in one go")
+    parser.add_argument("-p", "--processes", type=int, default=None, help="Batch mode: files decoded at the same time (default: one per CPU)")
+    parser.add_argument("--xlsx", action="store_true", help="Batch mode: also rewrite the .xlsx of every search (slow)")
+    parser.add_argument("--parquet", action="store_true", help="Batch mode: also write a typed .parquet next to every search")
+    parser.add_argument("--merge", default=None, metavar="PARQUET", help="Batch mode: write all the searches in one typed parquet file")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="Batch mode: where the state of the files decoded so far is kept")
+    parser.add_argument("--force", action="store_true", help="Batch mode: decode every file, even the unchanged ones")
+    parser.add_argument("--check", action="store_true", help="Also decode every code with the openlocationcode library and report any difference")
+    parser.add_argument("--cache", default=GEOCODE_CACHE_PATH, help="sqlite file where the geocoded localities are kept between runs")
+    parser.add_argument("--ttl-days", type=float, default=180, help="How long a geocoded locality stays valid")
+    parser.add_argument("--negative-ttl-days", type=float, default=7, help="How long a 'not found' locality is not asked again")
+    parser.add_argument("--rate", type=float, default=1.0, help="Maximum geocoding requests per second (Nominatim allows 1)")
+    parser.add_argument("--geocode-workers", type=int, default=4, help="Lookups in flight at the same time, within --rate")
+    parser.add_argument("--geocoder-domain", default=None, help="Another Nominatim compatible service, e.g. localhost:8080 for a local stand-in")
+    parser.add_argument("--geocoder-scheme", default=None, choices=["http", "https"])
     args = parser.parse_args()
 
-    locations(args.file)
+    geocoder_options = {'cache_path': args.cache, 'ttl_days': args.ttl_days, 'negative_ttl_days': args.negative_ttl_days,
+                        'rate': args.rate, 'workers': args.geocode_workers,
+                        'domain': args.geocoder_domain, 'scheme': args.geocoder_scheme}
+    if args.batch:
+        batch_locations(args.batch, processes=args.processes, check=args.check, write_xlsx=args.xlsx, write_parquet=args.parquet,
+                        merge_path=args.merge, manifest_path=args.manifest, force=args.force, geocoder_options=geocoder_options)
+    else:
+        geocoder = make_geocoder(**geocoder_options)
+        locations(args.file, check=args.check, geocoder=geocoder)
+        geocoder.cache.close()
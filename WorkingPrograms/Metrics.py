@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import datetime
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+# Where the time of a run goes and what goes wrong, beyond the print lines.
+# RunMetrics times the stages of a search (search, scroll, harvest, click, extract, save, export, and every listing
+# as a whole) and counts the fields that couldn't be parsed or weren't there, and the listings that failed, by
+# stage and exception type. RunReport writes it down: one JSON line per search (plus one for the run) and a
+# Prometheus textfile, overwritten after every search so a node_exporter can pick it up while the run goes on.
+# profiled() wraps the run in cProfile or pyinstrument when asked.
+
+#the stages that are reads of the page (DOM) and the ones that are writes to disk (I/O), the rest is mostly waiting
+DOM_STAGES = ('harvest', 'extract')
+IO_STAGES = ('save', 'export')
+
+
+def _percentile(values: list, point: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(point / 100 * (len(ordered) - 1))))]
+
+
+@dataclass
+class RunMetrics:
+    """timings by stage and failure counters of one search (or of a whole run, once merged)"""
+    durations: dict = field(default_factory=dict)    # stage -> [seconds]
+    failures: dict = field(default_factory=dict)     # 'field:ExceptionType' -> count, a value on the page that didn't parse
+    missing: dict = field(default_factory=dict)      # field -> count, a value that wasn't on the page at all
+    errors: dict = field(default_factory=dict)       # 'stage:ExceptionType' -> count, a listing that was given up
+
+    def record(self, stage: str, seconds: float):
+        self.durations.setdefault(stage, []).append(seconds)
+
+    @contextmanager
+    def time(self, stage: str):
+        """with metrics.time('click'): ... records how long the block took (also when it raises)"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def failure(self, name: str, error: Exception):
+        key = f"{name}:{type(error).__name__}"
+        self.failures[key] = self.failures.get(key, 0) + 1
+
+    def miss(self, name: str):
+        self.missing[name] = self.missing.get(name, 0) + 1
+
+    def error(self, stage: str, error: Exception):
+        key = f"{stage}:{type(error).__name__}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+    def merge(self, other: 'RunMetrics'):
+        for stage, values in other.durations.items():
+            self.durations.setdefault(stage, []).extend(values)
+        for mine, theirs in ((self.failures, other.failures), (self.missing, other.missing), (self.errors, other.errors)):
+            for key, count in theirs.items():
+                mine[key] = mine.get(key, 0) + count
+
+    def summary(self) -> dict:
+        """count, total, avg, p50, p90 and max seconds for every stage, plus the counters"""
+        stages = {
+            stage: {'count': len(values), 'total': sum(values), 'avg': sum(values) / len(values),
+                    'p50': _percentile(values, 50), 'p90': _percentile(values, 90), 'max': max(values)}
+            for stage, values in self.durations.items() if values
+        }
+        return {'stages': stages, 'failures': dict(self.failures), 'missing': dict(self.missing), 'errors': dict(self.errors)}
+
+
+def time_breakdown(stages: dict, waits: dict) -> dict:
+    """seconds spent waiting for the page, reading the DOM and writing to disk, from the stage and wait summaries"""
+    return {'waits': sum(stats['total'] for stats in waits.values()),
+            'dom': sum(stages[stage]['total'] for stage in DOM_STAGES if stage in stages),
+            'io': sum(stages[stage]['total'] for stage in IO_STAGES if stage in stages)}
+
+
+def _label(value: str) -> str:
+    """a label value as the text format wants it: backslash, double quote and newline escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunReport:
+    """JSON lines report (one line per search, one per failed search, one for the run) and Prometheus textfile of a run.
+    Either path can be None to skip that output."""
+    def __init__(self, jsonl_path: str = None, prom_path: str = None):
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+        self.run_id = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.started = time.perf_counter()
+        self.metrics = RunMetrics()   # everything of the run, for the textfile
+        self.waits = {}
+        self.searches = 0
+        self.failed_searches = 0
+        self.listings = 0
+        for path in (jsonl_path, prom_path):
+            if path:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _write_line(self, record: dict):
+        if self.jsonl_path:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps({'run': self.run_id, 'time': datetime.datetime.now().isoformat(timespec='seconds'), **record},
+                                      ensure_ascii=False, default=str) + '\n')
+
+    def search(self, summary: dict):
+        """one finished search: its summary as a JSON line, and its metrics added to the run's"""
+        metrics = summary.get('metrics') or RunMetrics()
+        self.metrics.merge(metrics)
+        for stage, stats in summary.get('waits', {}).items():
+            total = self.waits.setdefault(stage, {'count': 0, 'total': 0.0, 'fallbacks': 0})
+            for key in total:
+                total[key] += stats[key]
+        self.searches += 1
+        self.listings += summary.get('listings', 0) - summary.get('resumed', 0) - summary.get('overlaps', 0)
+        self._write_line({'type': 'search', **{key: value for key, value in summary.items() if key != 'metrics'},
+                          **metrics.summary()})
+        self.write_prometheus()
+
+    def failed(self, search: str, error: Exception):
+        self.failed_searches += 1
+        self._write_line({'type': 'search_failed', 'search': search, 'error': f"{type(error).__name__}: {error}"})
+        self.write_prometheus()
+
+    def finish(self, workers: int = 1) -> dict:
+        """the line of the whole run, also returned"""
+        seconds = time.perf_counter() - self.started
+        summary = self.metrics.summary()
+        record = {'type': 'run', 'searches': self.searches, 'failed_searches': self.failed_searches, 'workers': workers,
+                  'listings': self.listings, 'seconds': seconds, 'listings_per_min': self.listings / seconds * 60 if seconds else 0.0,
+                  'breakdown': time_breakdown(summary['stages'], self.waits), **summary}
+        self._write_line(record)
+        self.write_prometheus()
+        return record
+
+    def write_prometheus(self):
+        """Writes the textfile (to a temporary file first, so the collector never reads half of it)."""
+        if not self.prom_path:
+            return
+        seconds = time.perf_counter() - self.started
+        lines = []
+
+        def metric(name: str, kind: str, help_text: str, samples: list):
+            lines.append(f"# HELP gmaps_{name} {help_text}")
+            lines.append(f"# TYPE gmaps_{name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_label(label)}"' for key, label in labels.items())
+                lines.append(f"gmaps_{name}{{{label_text}}} {value}" if label_text else f"gmaps_{name} {value}")
+
+        stages = self.metrics.summary()['stages']
+        metric('stage_seconds_total', 'counter', 'Time spent in each stage of the scraper',
+               [({'stage': stage}, stats['total']) for stage, stats in stages.items()])
+        metric('stage_runs_total', 'counter', 'Times each stage ran', [({'stage': stage}, stats['count']) for stage, stats in stages.items()])
+        metric('stage_seconds_max', 'gauge', 'Slowest run of each stage', [({'stage': stage}, stats['max']) for stage, stats in stages.items()])
+        metric('wait_seconds_total', 'counter', 'Time spent waiting for page signals, by wait stage',
+               [({'stage': stage}, stats['total']) for stage, stats in self.waits.items()])
+        metric('wait_fallbacks_total', 'counter', 'Waits whose signal never came, by wait stage',
+               [({'stage': stage}, stats['fallbacks']) for stage, stats in self.waits.items()])
+        metric('field_failures_total', 'counter', 'Values on the page that could not be parsed, by field and exception',
+               [(dict(zip(('field', 'exception'), key.split(':', 1))), count) for key, count in self.metrics.failures.items()])
+        metric('field_missing_total', 'counter', 'Fields not found on the page', [({'field': name}, count) for name, count in self.metrics.missing.items()])
+        metric('listing_errors_total', 'counter', 'Listings given up, by stage and exception',
+               [(dict(zip(('stage', 'exception'), key.split(':', 1))), count) for key, count in self.metrics.errors.items()])
+        metric('searches_total', 'counter', 'Searches finished', [({}, self.searches)])
+        metric('searches_failed_total', 'counter', 'Searches that failed', [({}, self.failed_searches)])
+        metric('listings_total', 'counter', 'Listings handled (not counting the resumed ones nor the tile overlaps)', [({}, self.listings)])
+        metric('listings_per_minute', 'gauge', 'Listings handled per minute since the start of the run',
+               [({}, self.listings / seconds * 60 if seconds else 0.0)])
+        metric('run_seconds', 'gauge', 'Seconds since the start of the run', [({}, seconds)])
+
+        temporary = self.prom_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+        os.replace(temporary, self.prom_path)
+
+
+@contextmanager
+def profiled(profiler: str = None, output: str = None):
+    """Runs the block under cProfile (stats saved to output, e.g. run.prof) or pyinstrument (html saved to output),
+    and prints the top of the profile. profiler=None does nothing."""
+    if not profiler:
+        yield
+        return
+    if profiler == 'cprofile':
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            profile.dump_stats(output or 'run.prof')
+            pstats.Stats(profile).sort_stats('cumulative').print_stats(20)
+    elif profiler == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler   #optional, pip install pyinstrument
+        except ImportError:
+            raise ImportError("The pyinstrument profiler needs pyinstrument: pip install pyinstrument")
+        profile = Profiler(async_mode='enabled')
+        profile.start()
+        try:
+            yield
+        finally:
+            profile.stop()
+            with open(output or 'run_profile.html', 'w', encoding='utf-8') as file:
+                file.write(profile.output_html())
+            print(profile.output_text())
+    else:
+        raise ValueError(f"Unknown profiler '{profiler}', use cprofile or pyinstrument")
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from openlocationcode import openlocationcode as olc   #only used to double check the results (verify_against_olc)
+
+# Batch version of the Open Location Code (plus code) decoding used by Location.py.
+# Instead of calling olc.recoverNearest + olc.decode row by row, the codes are turned into a matrix of digits and
+# decoded all at once with NumPy, following the same algorithm as the reference library
+# (https://github.com/google/open-location-code), in integer units of the finest grid cell so no precision is lost.
+
+CODE_ALPHABET = "23456789CFGHJMPQRVWX"
+SEPARATOR = '+'
+SEPARATOR_POSITION = 8
+PAIR_CODE_LENGTH = 10
+MAX_DIGIT_COUNT = 15
+LAT_UNITS = 25_000_000    #finest cells per degree of latitude  (8000 * 5**5)
+LNG_UNITS = 8_192_000     #finest cells per degree of longitude (8000 * 4**5)
+
+_DIGIT = '[' + CODE_ALPHABET + ']'
+#a full code starts in a valid lat/lng cell, a short one has lost 2, 4, 6 or all 8 digits in front of the separator
+#(olc.shorten removes 8 when the reference is very close, then some digits must follow it).
+#Anything else (e.g. codes padded with '0') goes through the scalar library
+FULL_CODE_PATTERN = rf'^[{CODE_ALPHABET[:9]}][{CODE_ALPHABET[:18]}]{_DIGIT}{{6}}\{SEPARATOR}(?:{_DIGIT}{{2,}})?$'
+SHORT_CODE_PATTERN = (rf'^(?:(?:{_DIGIT}{{2}}|{_DIGIT}{{4}}|{_DIGIT}{{6}})\{SEPARATOR}(?:{_DIGIT}{{2,}})?'
+                      rf'|\{SEPARATOR}{_DIGIT}{{2,}})$')
+
+# value of one step of the digit at each of the 15 positions, in finest cells
+_LAT_PLACE = np.array([20 ** (4 - k // 2) * 3125 if k % 2 == 0 else 0 for k in range(PAIR_CODE_LENGTH)]
+                      + [5 ** (4 - k) for k in range(MAX_DIGIT_COUNT - PAIR_CODE_LENGTH)], dtype=np.int64)
+_LNG_PLACE = np.array([20 ** (4 - k // 2) * 1024 if k % 2 == 1 else 0 for k in range(PAIR_CODE_LENGTH)]
+                      + [4 ** (4 - k) for k in range(MAX_DIGIT_COUNT - PAIR_CODE_LENGTH)], dtype=np.int64)
+# size of the cell of a code with n digits (index n), in finest cells
+_LAT_SIZE = np.array([0, 0] + [20 ** (4 - (n // 2 - 1)) * 3125 if n <= PAIR_CODE_LENGTH else 5 ** (4 - (n - PAIR_CODE_LENGTH - 1))
+                               for n in range(2, MAX_DIGIT_COUNT + 1)], dtype=np.int64)
+_LNG_SIZE = np.array([0, 0] + [20 ** (4 - (n // 2 - 1)) * 1024 if n <= PAIR_CODE_LENGTH else 4 ** (4 - (n - PAIR_CODE_LENGTH - 1))
+                               for n in range(2, MAX_DIGIT_COUNT + 1)], dtype=np.int64)
+_LOOKUP = np.full(256, -1, dtype=np.int64)
+_LOOKUP[np.frombuffer(CODE_ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(CODE_ALPHABET))
+
+
+def _digits(codes: pd.Series, offsets: np.ndarray) -> tuple:
+    """Digit matrix (rows x 15, shifted right by offset for short codes) and the number of digits of each code."""
+    stripped = codes.str.replace(SEPARATOR, '', regex=False).str.slice(0, MAX_DIGIT_COUNT)
+    raw = np.array(stripped.str.ljust(MAX_DIGIT_COUNT).tolist(), dtype=f'S{MAX_DIGIT_COUNT}').view(np.uint8).reshape(-1, MAX_DIGIT_COUNT)
+    values = _LOOKUP[raw]                                  # -1 where there is no digit (the ljust padding)
+    lengths = np.minimum(offsets + stripped.str.len().to_numpy(), MAX_DIGIT_COUNT)
+    digits = np.zeros((len(codes), MAX_DIGIT_COUNT), dtype=np.int64)
+    positions = np.arange(MAX_DIGIT_COUNT)
+    for offset in np.unique(offsets):                      # at most 4 groups: full, and short missing 2, 4 or 6 digits
+        rows = offsets == offset
+        digits[rows, offset:] = values[rows, :MAX_DIGIT_COUNT - offset]
+    digits[(digits < 0) | (positions >= lengths[:, None])] = 0
+    return digits, lengths
+
+
+def _units(digits: np.ndarray) -> tuple:
+    """south-west corner of the cells, in finest cells from (-90, -180)"""
+    lat_digit = np.where(np.arange(MAX_DIGIT_COUNT) < PAIR_CODE_LENGTH, digits, digits // 4)
+    lng_digit = np.where(np.arange(MAX_DIGIT_COUNT) < PAIR_CODE_LENGTH, digits, digits % 4)
+    return lat_digit @ _LAT_PLACE, lng_digit @ _LNG_PLACE
+
+
+def decode_batch(codes, ref_lat=None, ref_lng=None) -> tuple:
+    """Centre latitude and longitude of many plus codes at once, like olc.decode(olc.recoverNearest(code, ref_lat, ref_lng)).
+
+    codes is a list/Series of codes without the locality ('75WG+R4', '8FVC9G8F+6X'); ref_lat/ref_lng are arrays
+    with the reference point of every row, only needed by the short codes (NaN for the full ones).
+    Returns (lat, lng, ok): ok is False for the codes that aren't valid full or short codes (their lat/lng are NaN).
+    """
+    codes = pd.Series(codes, dtype=object).astype(str).str.strip().str.upper().reset_index(drop=True)
+    count = len(codes)
+    ref_lat = np.full(count, np.nan) if ref_lat is None else np.asarray(ref_lat, dtype=float)
+    ref_lng = np.full(count, np.nan) if ref_lng is None else np.asarray(ref_lng, dtype=float)
+
+    full = codes.str.match(FULL_CODE_PATTERN).to_numpy()
+    short = codes.str.match(SHORT_CODE_PATTERN).to_numpy() & ~np.isnan(ref_lat) & ~np.isnan(ref_lng)
+    ok = full | short
+    padding = np.where(short, SEPARATOR_POSITION - codes.str.find(SEPARATOR).to_numpy(), 0)
+
+    digits, lengths = _digits(codes.where(ok, ''), padding)
+    lat_lo, lng_lo = _units(digits)
+
+    # short codes: the missing digits are the ones of the reference point, at the resolution of the padding
+    clipped_lat = np.clip(np.nan_to_num(ref_lat), -90, 90)
+    normal_lng = (np.nan_to_num(ref_lng) + 180) % 360 - 180
+    ref_lat_units = (clipped_lat + 90) * LAT_UNITS
+    ref_lng_units = (normal_lng + 180) * LNG_UNITS
+    resolution = np.power(20.0, 2 - padding / 2)           # degrees, as in olc.recoverNearest
+    lat_res = np.rint(resolution * LAT_UNITS).astype(np.int64)
+    lng_res = np.rint(resolution * LNG_UNITS).astype(np.int64)
+    #(a reference on the north pole belongs to the last row of cells, like olc.encode does)
+    prefix_lat_units = np.minimum(np.floor(np.round(ref_lat_units, 6)).astype(np.int64), 180 * LAT_UNITS - 1)
+    lat_lo = lat_lo + np.where(short, prefix_lat_units // lat_res * lat_res, 0)
+    lng_lo = lng_lo + np.where(short, np.floor(np.round(ref_lng_units, 6)).astype(np.int64) // lng_res * lng_res, 0)
+
+    lat_centre = lat_lo + _LAT_SIZE[lengths] / 2
+    lng_centre = lng_lo + _LNG_SIZE[lengths] / 2
+
+    # the nearest match to the reference can be in the next cell up/down or left/right
+    lat_half, lng_half = lat_res / 2, lng_res / 2
+    down = short & (ref_lat_units + lat_half < lat_centre) & (lat_centre - lat_res >= 0)
+    up = short & ~down & (ref_lat_units - lat_half > lat_centre) & (lat_centre + lat_res <= 180 * LAT_UNITS)
+    lat_centre = lat_centre - np.where(down, lat_res, 0) + np.where(up, lat_res, 0)
+    left = short & (ref_lng_units + lng_half < lng_centre)
+    right = short & ~left & (ref_lng_units - lng_half > lng_centre)
+    lng_centre = lng_centre - np.where(left, lng_res, 0) + np.where(right, lng_res, 0)
+
+    lat = np.minimum(lat_centre / LAT_UNITS - 90, 90)
+    lng = lng_centre / LNG_UNITS - 180
+    lng = np.where(short, (lng + 180) % 360 - 180, np.minimum(lng, 180))   # recovered codes are re-encoded, which wraps the longitude
+    lat = np.where(ok, np.round(lat, 14), np.nan)
+    lng = np.where(ok, np.round(lng, 14), np.nan)
+    return lat, lng, ok
+
+
+def verify_against_olc(codes, ref_lat=None, ref_lng=None, tolerance: float = 1e-9) -> list:
+    """Decodes the codes with both decode_batch and the openlocationcode library and returns the rows that differ,
+    as (row, code, batch (lat, lng), library (lat, lng) or None). Rows decode_batch leaves out aren't compared."""
+    lat, lng, ok = decode_batch(codes, ref_lat, ref_lng)
+    mismatches = []
+    for row, code in enumerate(pd.Series(codes, dtype=object).astype(str).str.strip()):
+        if not ok[row]:
+            continue   # Location.py sends these through the library anyway
+        try:
+            area = olc.decode(code if olc.isFull(code) else olc.recoverNearest(code, ref_lat[row], ref_lng[row]))
+            expected = (area.latitudeCenter, area.longitudeCenter)
+        except Exception:
+            expected = None
+        if expected is None or abs(expected[0] - lat[row]) > tolerance or abs(expected[1] - lng[row]) > tolerance:
+            mismatches.append((row, code, (lat[row], lng[row]), expected))
+    return mismatches
@@ -0,0 +1,170 @@
+import json      #the search responses are (almost) plain JSON
+import re        #to pull the place id out of the listing href
+import os
+import asyncio   #the response bodies are read in the background while the scraper keeps scrolling
+import argparse
+
+# While the results list is scrolled, Google Maps fills it with XHR responses ('/search?tbm=map...') that already
+# carry most of what we click for. This module reads those responses and turns them into dicts that map straight
+# onto Business, so the scraper only has to click a listing when something is missing.
+# It doesn't import playwright on purpose: the parser can be run offline on recorded responses (see __main__ below).
+
+# --- Where the fields are inside a place record ---
+#a place record is a long nested list, these are the positions of the fields we need (as Google ships them today).
+#If the format changes, this is the only place that needs editing
+PLACE_PATHS = {
+    'place_id': [10],            # '0x4786c6...:0x3b0f...', the same id that is in the '!1s' part of the listing href
+    'name': [11],
+    'address': [39],
+    'domain': [7, 1],
+    'phone_number': [178, 0, 0],
+    'category': [13, 0],
+    'reviews_average': [4, 7],
+    'reviews_count': [4, 8],
+    'latitude': [9, 2],          # these are the real coordinates of the place, not the centre of the map in the url
+    'longitude': [9, 3],
+    'plus_code': [183, 2, 2, 0],
+}
+
+#only the responses whose url contains one of these are worth reading
+SEARCH_URL_MARKERS = ('tbm=map', '/maps/preview/place')
+
+_XSSI_PREFIX = ")]}'"    #Google puts this in front of its JSON so that it can't be loaded as a script
+_PLACE_ID_IN_HREF = re.compile(r'!1s(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)')
+
+
+def place_id_from_href(href: str):
+    """'https://www.google.com/maps/place/Name/data=!4m7!3m6!1s0x47c6...:0x2a...!8m2...' -> '0x47c6...:0x2a...'"""
+    if not href:
+        return None
+    match = _PLACE_ID_IN_HREF.search(href)
+    return match.group(1) if match else None
+
+
+def _dig(obj, path: list):
+    """obj[path[0]][path[1]]... or None if any step is missing"""
+    for step in path:
+        if not isinstance(obj, list) or step >= len(obj) or obj[step] is None:
+            return None
+        obj = obj[step]
+    return obj
+
+
+def _load(text: str):
+    """Strips the anti-XSSI prefix and the trailing comment, and unwraps the {"c":..,"d":"..."} envelope if there is one."""
+    text = text.strip()
+    if text.endswith('/*""*/'):
+        text = text[:-len('/*""*/')]
+    if text.startswith(_XSSI_PREFIX):
+        text = text[len(_XSSI_PREFIX):]
+    payload = json.loads(text)
+    if isinstance(payload, dict) and isinstance(payload.get('d'), str):
+        return _load(payload['d'])
+    return payload
+
+
+def _looks_like_place(record) -> bool:
+    """a place record has a name at [11] and the coordinates at [9][2], [9][3]"""
+    return (isinstance(record, list) and len(record) > 11 and isinstance(record[11], str)
+            and isinstance(_dig(record, [9, 2]), (int, float)) and isinstance(_dig(record, [9, 3]), (int, float)))
+
+
+def _find_places(obj):
+    """walks the nested lists and yields every place record (without going inside the ones already found)"""
+    if _looks_like_place(obj):
+        yield obj
+    elif isinstance(obj, list):
+        for item in obj:
+            yield from _find_places(item)
+
+
+def parse_place(record: list) -> tuple:
+    """One place record -> (place_id, fields), where fields can be passed as Business(**fields)."""
+    fields = {name: _dig(record, path) for name, path in PLACE_PATHS.items()}
+    place_id = fields.pop('place_id')
+    for name in ('name', 'address', 'domain', 'phone_number', 'category', 'plus_code'):
+        if not isinstance(fields[name], str) or not fields[name].strip():
+            fields[name] = None
+        else:
+            fields[name] = fields[name].strip()
+    try:
+        fields['reviews_count'] = int(fields['reviews_count']) if fields['reviews_count'] is not None else None
+    except (TypeError, ValueError):
+        fields['reviews_count'] = None
+    for name in ('reviews_average', 'latitude', 'longitude'):
+        if not isinstance(fields[name], (int, float)):
+            fields[name] = None
+    # same as the detail pane: the website is built from the domain
+    fields['website'] = f"https://www.{fields['domain']}" if fields['domain'] else None
+    return place_id if isinstance(place_id, str) else None, fields
+
+
+def parse_response(text: str) -> list[tuple]:
+    """Parses the body of a search response into a list of (place_id, fields). Anything unreadable gives []."""
+    try:
+        payload = _load(text)
+    except (ValueError, TypeError):
+        return []
+    return [parse_place(record) for record in _find_places(payload)]
+
+
+# --- Live collection ---
+class ResponseCollector:
+    """Listens to the page responses while the scraper scrolls and keeps the places found in them, by place id.
+
+    Usage: page.on("response", collector.on_response) before the search, await collector.drain() after scrolling.
+    If record_dir is given every matching body is also saved there, so it can be parsed again offline.
+    """
+    def __init__(self, record_dir: str = None, url_markers: tuple = SEARCH_URL_MARKERS):
+        self.records = {}    # place id -> fields
+        self.record_dir = record_dir
+        self.url_markers = url_markers
+        self.responses_read = 0
+        self._pending = set()
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+
+    def on_response(self, response):
+        if not any(marker in response.url for marker in self.url_markers):
+            return
+        #reading the body is async, so it becomes a task and the event doesn't block the page
+        task = asyncio.ensure_future(self._read(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _read(self, response):
+        try:
+            text = await response.text()
+        except Exception:
+            return    # the body is gone (e.g. the page navigated away), clicking will cover for it
+        if self.record_dir:
+            with open(os.path.join(self.record_dir, f"response_{self.responses_read:04d}.txt"), 'w', encoding='utf-8') as file:
+                file.write(text)
+        self.add_text(text)
+
+    def add_text(self, text: str):
+        self.responses_read += 1
+        for place_id, fields in parse_response(text):
+            if place_id:
+                self.records.setdefault(place_id, fields)
+
+    def get(self, place_id: str):
+        return self.records.get(place_id) if place_id else None
+
+    async def drain(self):
+        """waits for the bodies still being read"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse recorded Google Maps search responses offline")
+    parser.add_argument("files", nargs="+", help="Response bodies saved by the scraper with --record-responses")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            places = parse_response(file.read())
+        print(f"--- {file_path}: {len(places)} places")
+        for place_id, fields in places:
+            print(place_id, json.dumps(fields, ensure_ascii=False))
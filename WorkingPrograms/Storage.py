@@ -0,0 +1,179 @@
+import sqlite3   #comes with python, one file on disk and every insert is safe as soon as it is committed
+import json
+import time
+import datetime
+import hashlib   #stable hashes: python's hash() changes every run, so it can't be saved to disk
+import csv
+import glob
+import os
+import threading
+import argparse
+
+# Append-only store for the scraped businesses. Every business is written the moment BusinessList accepts it,
+# together with a checkpoint saying which listing it came from, so a crash only loses the listing being clicked
+# and the next run with the same search picks up where the previous one stopped.
+# The .xlsx/.csv files are only an export of what is in here.
+# Next to it, DedupeIndex remembers every business ever scraped, across searches and days.
+
+#the fields that make two businesses the same one (the same ones Business.__hash__ always used)
+FINGERPRINT_FIELDS = (('domain', 'domain'), ('website', 'website'), ('phone_number', 'phone'), ('plus_code', 'plus_code'))
+NUMERIC_FIELDS = {'reviews_count': int, 'reviews_average': float, 'latitude': float, 'longitude': float}
+
+
+def business_fingerprint(fields: dict) -> str:
+    """sha1 of the name plus the identifying fields that are set, the same in every run and on every machine"""
+    hash_fields = [str(fields.get('name'))]
+    for name, label in FINGERPRINT_FIELDS:
+        if fields.get(name):
+            hash_fields.append(f"{label}:{fields[name]}")
+    return hashlib.sha1('\x1f'.join(hash_fields).encode('utf-8')).hexdigest()
+
+
+class QueryStore:
+    """One sqlite file per day folder, shared by all the searches (and workers) of that day.
+
+    businesses: one row per accepted business, as JSON of its fields
+    done:       one row per listing already handled (place id from the href, or '#<index>' when there is none)
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # the scraper reads a search's records from a worker thread (asyncio.to_thread) while the event loop thread
+        # keeps writing checkpoints, so the connection is shared across threads and every use goes through the lock
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        # WAL: writers don't block readers and a crash in the middle of a write doesn't corrupt the file
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS businesses (
+                query TEXT NOT NULL,
+                data TEXT NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS businesses_query ON businesses (query);
+            CREATE TABLE IF NOT EXISTS done (
+                query TEXT NOT NULL,
+                listing_key TEXT NOT NULL,
+                PRIMARY KEY (query, listing_key)
+            );
+        """)
+        self.connection.commit()
+
+    def record(self, query: str, listing_key: str, business: dict = None):
+        """Marks a listing as done and, if it gave a new business, appends it. Both in the same transaction."""
+        with self.lock, self.connection:
+            if business is not None:
+                self.connection.execute(
+                    "INSERT INTO businesses (query, data, added_at) VALUES (?, ?, ?)",
+                    (query, json.dumps(business, ensure_ascii=False), time.time()))
+            self.connection.execute(
+                "INSERT OR IGNORE INTO done (query, listing_key) VALUES (?, ?)", (query, listing_key))
+
+    def businesses(self, query: str) -> list[dict]:
+        """every business stored for the search, in the order they were added"""
+        with self.lock:
+            rows = self.connection.execute("SELECT data FROM businesses WHERE query = ? ORDER BY rowid", (query,)).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def done_keys(self, query: str) -> set:
+        with self.lock:
+            return {key for (key,) in self.connection.execute("SELECT listing_key FROM done WHERE query = ?", (query,))}
+
+    def queries(self) -> list[str]:
+        with self.lock:
+            return [query for (query,) in self.connection.execute("SELECT DISTINCT query FROM businesses ORDER BY query")]
+
+    def reset(self, query: str):
+        """forgets the checkpoints of a search, so that it is scraped again from the first listing"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM done WHERE query = ?", (query,))
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+class DedupeIndex:
+    """Every business scraped so far, by any search on any day: GMaps Data/dedupe_index.sqlite
+
+    Each business is saved under its fingerprint and, when known, under 'place:<place id>', so
+    "already scraped?" is a primary key lookup whatever the size of the data, without opening any csv.
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS seen (
+                key TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                query TEXT,
+                first_seen TEXT
+            ) WITHOUT ROWID
+        """)
+        self.connection.commit()
+
+    def __contains__(self, key: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM seen WHERE key = ?", (key,)).fetchone() is not None
+
+    def get(self, key: str):
+        """the fields saved under key, or None"""
+        row = self.connection.execute("SELECT data FROM seen WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, fields: dict, query: str = None, place_id: str = None, commit: bool = True) -> bool:
+        """Saves a business under its fingerprint (and place id). Returns False if it was already there."""
+        keys = [business_fingerprint(fields)] + ([f"place:{place_id}"] if place_id else [])
+        data = json.dumps(fields, ensure_ascii=False)
+        today = datetime.date.today().isoformat()
+        new = False
+        for key in keys:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO seen (key, data, query, first_seen) VALUES (?, ?, ?, ?)", (key, data, query, today))
+            new = new or (key == keys[0] and cursor.rowcount == 1)
+        if commit:
+            self.connection.commit()
+        return new
+
+    def rebuild(self, data_dir: str) -> int:
+        """Seeds the index with every csv already exported under data_dir (e.g. 'GMaps Data'), streaming row by row."""
+        added = 0
+        for csv_path in sorted(glob.glob(os.path.join(data_dir, '*', '*.csv'))):
+            query = os.path.splitext(os.path.basename(csv_path))[0]
+            with open(csv_path, newline='', encoding='utf-8') as file:
+                for row in csv.DictReader(file):
+                    added += self.add(_clean_row(row), query=query, commit=False)
+            self.connection.commit()
+        return added
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM seen WHERE key NOT LIKE 'place:%'").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+
+def _clean_row(row: dict) -> dict:
+    """a csv row as the fields of a Business: no empty cells, no index columns, numbers back to numbers"""
+    fields = {}
+    for name, value in row.items():
+        if not name or name.startswith('Unnamed:') or value in ('', None):
+            continue
+        if name in NUMERIC_FIELDS:
+            try:
+                value = NUMERIC_FIELDS[name](float(value))
+            except ValueError:
+                continue
+        fields[name] = value
+    return fields
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the cross search dedupe index from the csv files already exported")
+    parser.add_argument("-d", "--data", default="GMaps Data", help="Folder with the date subfolders")
+    args = parser.parse_args()
+
+    index = DedupeIndex(os.path.join(args.data, 'dedupe_index.sqlite'))
+    print(f"Added {index.rebuild(args.data)} businesses, {len(index)} in the index")
+    index.close()
@@ -0,0 +1,236 @@
+import math
+import random
+import argparse
+from dataclasses import dataclass, field
+from urllib.parse import quote_plus   #the search term goes in the url path
+from GeocodeCache import TokenBucket   #Nominatim allows 1 request per second
+
+# A search like "restaurants in Milan" stops at about 120 results whatever the size of the city: that's a Maps limit,
+# not the number of restaurants. Here the area of a search is cut into a grid of map viewports (tiles), every tile
+# is searched on its own through a /search/<term>/@lat,lng,zoomz url, and a tile that comes back full is split
+# in four and searched again, until the results stop hitting the cap (or the depth/shard budget runs out).
+# No playwright in here on purpose: the planning and the subdivision can be run and checked offline (see __main__).
+
+MAPS_URL = "https://www.google.com/maps"
+RESULT_CAP = 120           #what Maps returns at most for one search
+KM_PER_DEGREE = 111.32     #one degree of latitude (and of longitude at the equator)
+VIEWPORT = (1280, 900)     #px, the viewport of the lean profile
+MIN_ZOOM, MAX_ZOOM = 3, 21
+
+
+@dataclass(frozen=True)
+class Tile:
+    """A rectangle of the map, in degrees. depth is how many times it was split from a tile of the initial grid."""
+    south: float
+    west: float
+    north: float
+    east: float
+    depth: int = 0
+
+    @property
+    def key(self) -> str:
+        """the same in every run, used for the checkpoints of the shards"""
+        return f"{self.south:.6f},{self.west:.6f},{self.north:.6f},{self.east:.6f}"
+
+    @property
+    def center(self) -> tuple:
+        return (self.south + self.north) / 2, (self.west + self.east) / 2
+
+    def contains(self, lat: float, lng: float) -> bool:
+        """south/west edges included, north/east excluded, so a point on a shared edge belongs to one tile only"""
+        return self.south <= lat < self.north and self.west <= lng < self.east
+
+    def split(self) -> list['Tile']:
+        """the four quadrants, one level deeper"""
+        lat, lng = self.center
+        return [Tile(south, west, north, east, self.depth + 1)
+                for south, north in ((self.south, lat), (lat, self.north))
+                for west, east in ((self.west, lng), (lng, self.east))]
+
+    def zoom(self, viewport: tuple = VIEWPORT) -> int:
+        """The closest zoom at which the whole tile still fits in the viewport (web mercator: 256px for 360° at zoom 0)."""
+        lat, _ = self.center
+        lng_span = max(self.east - self.west, 1e-9)
+        lat_span = max(self.north - self.south, 1e-9) / max(math.cos(math.radians(lat)), 1e-6)   #a degree of latitude looks longer away from the equator
+        zoom = min(math.log2(360 * viewport[0] / (256 * lng_span)), math.log2(360 * viewport[1] / (256 * lat_span)))
+        return max(MIN_ZOOM, min(MAX_ZOOM, math.floor(zoom)))
+
+    def url(self, term: str, base_url: str = MAPS_URL, viewport: tuple = VIEWPORT) -> str:
+        """'https://www.google.com/maps/search/restaurants/@45.464200,9.190000,15z': the term searched inside this tile only"""
+        lat, lng = self.center
+        return f"{base_url.rstrip('/')}/search/{quote_plus(term)}/@{lat:.6f},{lng:.6f},{self.zoom(viewport)}z"
+
+
+def parse_bounds(text: str) -> Tile:
+    """'south,west,north,east' (e.g. '45.38,9.04,45.54,9.28') -> Tile"""
+    try:
+        south, west, north, east = (float(value) for value in text.split(','))
+    except ValueError:
+        raise ValueError(f"Bounds must be 'south,west,north,east', got '{text}'")
+    if not (-90 <= south < north <= 90 and -180 <= west < east <= 180):
+        raise ValueError(f"Bounds must have south < north and west < east, got '{text}'")
+    return Tile(south, west, north, east)
+
+
+def area_bounds(locality: str, geolocator) -> Tile:
+    """Bounding box of a city/area from anything with geopy's .geocode (Nominatim gives [south, north, west, east]), or None."""
+    location = geolocator.geocode(locality)
+    box = (location.raw or {}).get('boundingbox') if location else None
+    if not box:
+        return None
+    south, north, west, east = (float(value) for value in box)
+    return Tile(south, west, north, east)
+
+
+def search_areas(search_list: list, geolocator, rate: float = 1.0) -> dict:
+    """search -> Tile (or None) for the '<what> in <where>' searches: one lookup per distinct locality, at most rate a second,
+    so a long input.txt with many searches in the same city asks for that city once."""
+    bucket = TokenBucket(rate)
+    areas = {}
+    for locality in dict.fromkeys(search_locality(search_for) for search_for in search_list):
+        if locality is None:
+            continue
+        bucket.acquire()
+        try:
+            areas[locality] = area_bounds(locality, geolocator)
+        except Exception as e:
+            print(f"Could not get the area of '{locality}': {e}")
+            areas[locality] = None
+    return {search_for: areas.get(search_locality(search_for)) for search_for in search_list}
+
+
+def search_locality(search_for: str) -> str:
+    """'restaurants in Milan' -> 'Milan', None without ' in '"""
+    return search_for.split(' in ')[-1].strip() or None if ' in ' in search_for else None
+
+
+def search_term(search_for: str) -> str:
+    """'restaurants in Milan' -> 'restaurants': the area comes from the tile, the locality would make Maps move the map"""
+    return search_for.split(' in ')[0].strip() if ' in ' in search_for else search_for.strip()
+
+
+def plan_tiles(bounds: Tile, tile_km: float) -> list[Tile]:
+    """Cuts the bounds into a grid of tiles of about tile_km x tile_km (fewer, larger ones at the edges never go below the bounds)."""
+    lat, _ = bounds.center
+    lat_step = tile_km / KM_PER_DEGREE
+    lng_step = tile_km / (KM_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    rows = max(1, math.ceil((bounds.north - bounds.south) / lat_step))
+    columns = max(1, math.ceil((bounds.east - bounds.west) / lng_step))
+    lat_edges = [bounds.south + (bounds.north - bounds.south) * row / rows for row in range(rows + 1)]
+    lng_edges = [bounds.west + (bounds.east - bounds.west) * column / columns for column in range(columns + 1)]
+    return [Tile(lat_edges[row], lng_edges[column], lat_edges[row + 1], lng_edges[column + 1])
+            for row in range(rows) for column in range(columns)]
+
+
+def is_saturated(result_count: int, cap: int = RESULT_CAP) -> bool:
+    """a tile that gave as many results as Maps ever returns probably has more than that"""
+    return result_count is not None and result_count >= cap
+
+
+@dataclass
+class ShardPlan:
+    """Which tiles of one search are still to be scraped.
+
+    initial() gives the tiles to start with, finished(tile, count) the ones to add after a tile is done (its
+    quadrants, if it was saturated). complete is True once every tile handed out has come back.
+    done is the set of checkpoints of a previous run (store.done_keys): 'tile:<key>' for a tile scraped to the
+    end, 'split:<key>' for one that was split, so a resumed run starts from the tiles still missing.
+    """
+    bounds: Tile
+    tile_km: float = 2.0
+    cap: int = RESULT_CAP
+    max_depth: int = 3
+    max_shards: int = None     #budget: at most this many tiles scraped in this run (the grid is coarsened to fit, saturated tiles stop being split)
+    done: set = field(default_factory=set)
+    pending: int = 0
+    stats: dict = field(default_factory=lambda: {'planned': 0, 'scraped': 0, 'split': 0, 'resumed': 0, 'failed': 0,
+                                                 'saturated_leaves': 0, 'deferred': 0, 'max_depth': 0})
+
+    def initial(self) -> list[Tile]:
+        grid = plan_tiles(self.bounds, self.tile_km)
+        while self.max_shards is not None and len(grid) > max(1, self.max_shards):
+            #too many tiles for the budget: larger ones, so the whole area is still covered (the same in every run, for the resume)
+            self.tile_km *= max(1.01, math.sqrt(len(grid) / max(1, self.max_shards)))
+            grid = plan_tiles(self.bounds, self.tile_km)
+        self.stats['planned'] = len(grid)
+        tiles = [tile for grid_tile in grid for tile in self._resume(grid_tile)]
+        if self.max_shards is not None and len(tiles) > max(1, self.max_shards):
+            #a previous run with a larger budget split more than fits in this one: the rest waits for the next run
+            self.stats['deferred'] = len(tiles) - max(1, self.max_shards)
+            tiles = tiles[:max(1, self.max_shards)]
+        return self._schedule(tiles)
+
+    def _resume(self, tile: Tile) -> list[Tile]:
+        if f"split:{tile.key}" in self.done:
+            return [leaf for child in tile.split() for leaf in self._resume(child)]
+        if f"tile:{tile.key}" in self.done:
+            self.stats['resumed'] += 1
+            return []
+        return [tile]
+
+    def _schedule(self, tiles: list[Tile]) -> list[Tile]:
+        self.pending += len(tiles)
+        return tiles
+
+    def finished(self, tile: Tile, result_count: int = None) -> tuple:
+        """Books a tile as done; result_count=None means it failed (it isn't checkpointed, the next run tries it again).
+        Returns (checkpoint, children): the key to record in the store (or None) and the tiles to scrape next."""
+        self.pending -= 1
+        if result_count is None:
+            self.stats['failed'] += 1
+            return None, []
+        self.stats['scraped'] += 1
+        self.stats['max_depth'] = max(self.stats['max_depth'], tile.depth)
+        if not is_saturated(result_count, self.cap):
+            return f"tile:{tile.key}", []
+        over_budget = self.max_shards is not None and self.stats['scraped'] + self.pending + 4 > self.max_shards
+        if tile.depth >= self.max_depth or over_budget:
+            self.stats['saturated_leaves'] += 1   #there may be more results in here than we got
+            return f"tile:{tile.key}", []
+        self.stats['split'] += 1
+        return f"split:{tile.key}", self._schedule(tile.split())
+
+    @property
+    def complete(self) -> bool:
+        return self.pending == 0
+
+
+def simulate(plan: ShardPlan, places: list[tuple]) -> set:
+    """Runs the plan against a list of (lat, lng) places instead of Maps: every tile 'returns' the first plan.cap
+    places inside it. Returns the indexes of the places found, to check the coverage offline."""
+    found = set()
+    queue = plan.initial()
+    while queue:
+        tile = queue.pop()
+        inside = [number for number, (lat, lng) in enumerate(places) if tile.contains(lat, lng)][:plan.cap]
+        found.update(inside)
+        _, children = plan.finished(tile, len(inside))
+        queue.extend(children)
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plan the tiles of a search and check the subdivision offline on random places")
+    parser.add_argument("--bbox", required=True, help="south,west,north,east of the area, e.g. 45.38,9.04,45.54,9.28")
+    parser.add_argument("--tile-km", type=float, default=2.0, help="Side of the initial tiles")
+    parser.add_argument("--cap", type=int, default=RESULT_CAP, help="Results after which a tile counts as saturated")
+    parser.add_argument("--max-depth", type=int, default=3, help="How many times a tile can be split")
+    parser.add_argument("--max-shards", type=int, default=None, help="Tiles budget for the run")
+    parser.add_argument("--simulate", type=int, default=0, metavar="N", help="Run the plan on N random places clustered around the centre")
+    parser.add_argument("--term", default="restaurants", help="Search term of the example urls")
+    args = parser.parse_args()
+
+    bounds = parse_bounds(args.bbox)
+    plan = ShardPlan(bounds, tile_km=args.tile_km, cap=args.cap, max_depth=args.max_depth, max_shards=args.max_shards)
+    if args.simulate:
+        random.seed(0)
+        lat, lng = bounds.center
+        #most places in the centre, like in a real city, so the central tiles need splitting
+        places = [(min(max(random.gauss(lat, (bounds.north - bounds.south) / 6), bounds.south), bounds.north - 1e-9),
+                   min(max(random.gauss(lng, (bounds.east - bounds.west) / 6), bounds.west), bounds.east - 1e-9))
+                  for _ in range(args.simulate)]
+        found = simulate(plan, places)
+        print(f"Found {len(found)}/{len(places)} places ({len(found) / len(places):.1%}) with {plan.stats}")
+    else:
+        tiles = plan.initial()
+        print(f"{len(tiles)} tiles, zoom {tiles[0].zoom()}, e.g. {tiles[len(tiles) // 2].url(args.term)}")
@@ -1,9 +1,23 @@
 import datetime          #for date stamped folders  
-from playwright.sync_api import sync_playwright     #automatically controls the browser 
-from dataclasses import dataclass, asdict, field  #defines the objects 
+import asyncio           #lets several browser contexts scrape at the same time, while one waits the others keep working
+import time              #to measure how long each search takes
+from playwright.async_api import async_playwright     #automatically controls the browser (async version, needed for the worker pool)
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError  #raised when a signal we are waiting for never shows up
+from dataclasses import dataclass, asdict, field, fields  #defines the objects 
+from operator import attrgetter   #reads the same attributes from many objects at C speed
 import pandas as pd       
+import numpy as np        #whole columns cast at once for the exports
+try:
+    import pyarrow as pa            #optional, only needed for the parquet export
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 import argparse    #Command-line input refers to the additional pieces of information, called arguments, that you include after the script name to customize how the script runs. e.g.  python file_processor.py --input data.txt --output results.csv
 import os  #operating system dependent functionality, create folders, check if files exist, checks working directory
+from ResponseParser import ResponseCollector, place_id_from_href   #reads the places out of the search responses (network engine)
+from Storage import QueryStore, DedupeIndex, business_fingerprint   #append-only sqlite store with the per search checkpoints, and the cross search dedupe index
+from Tiling import Tile, ShardPlan, parse_bounds, search_areas, search_term, RESULT_CAP   #splits a search's area in map tiles to get past the ~120 results cap
+from Metrics import RunMetrics, RunReport, time_breakdown, profiled   #stage timings, failure counters and the run report
 import sys   #so sys is a library used to interact with the python program (the argument, the execution state, etc.)
 
 
@@ -22,12 +36,12 @@ def load_existing_data(base_name: str, save_path: str) -> list['Business']:
             df = df.drop(columns=[c for c in df.columns if 'Unnamed:' in c], errors='ignore')
 
             # Convert each row back to a Business object, handling NaNs
-            existing_businesses = []
-            for _, row in df.iterrows():
-                # Filter out NaN values before creating Business object
-                # This ensures Business() is initialized with valid types/None
-                valid_data = {k: v for k, v in row.to_dict().items() if pd.notna(v)}
-                existing_businesses.append(Business(**valid_data)) #so I am adding an instance of the Business object, which can be appended to a list
+            # to_dict('records') converts the whole frame at once, iterrows() built a Series for every single row
+            # Filter out NaN values before creating Business object
+            # This ensures Business() is initialized with valid types/None
+            existing_businesses = [
+                Business(**{k: v for k, v in row.items() if pd.notna(v)}) for row in df.to_dict('records')
+            ]
                 
             print(f"Loaded {len(existing_businesses)} existing records for updating.")
             return existing_businesses
@@ -38,7 +52,7 @@ def load_existing_data(base_name: str, save_path: str) -> list['Business']:
 
 # --- Data Classes ---
 
-@dataclass
+@dataclass(slots=True)   #slots: no per-object __dict__, a fraction of the memory when there are hundreds of thousands of them
 class Business:
     """holds business data"""     #beware that the type hints are just hints, they don't have much to do with execution
     name: str = None
@@ -53,18 +67,45 @@ class Business:
     latitude: float = None
     longitude: float = None
     plus_code: str = None 
+    def fingerprint(self) -> str:
+        """Stable id for duplicate detection: name + domain, website, phone and plus code (when set).
+        Unlike hash() it's the same in every run, so it can be saved in the dedupe index."""
+        return business_fingerprint({name: getattr(self, name) for name in ('name', 'domain', 'website', 'phone_number', 'plus_code')})
+
     def __hash__(self):
         """Make Business hashable for duplicate detection."""
-        hash_fields = [self.name]
-        if self.domain:
-            hash_fields.append(f"domain:{self.domain}")
-        if self.website:
-            hash_fields.append(f"website:{self.website}")
-        if self.phone_number:
-            hash_fields.append(f"phone:{self.phone_number}")
-        if self.plus_code:
-            hash_fields.append(f"plus_code:{self.plus_code}")    
-        return hash(tuple(hash_fields))
+        return hash(self.fingerprint())
+
+#explicit column types for the exports, in the order of the Business fields
+BUSINESS_DTYPES = {
+    business_field.name: {int: 'Int64', float: 'float64'}.get(business_field.type, 'string') for business_field in fields(Business)
+}
+ARROW_SCHEMA = pa.schema([
+    (name, {'Int64': pa.int64(), 'float64': pa.float64()}.get(dtype, pa.string())) for name, dtype in BUSINESS_DTYPES.items()
+]) if pa else None
+
+
+def _typed_column(values, dtype: str) -> pd.Series:
+    """a whole column to its type in one go: missing/NaN/unparsable values become NA, numbers are also read from
+    strings, and floats read back from csv (reviews_count 12.0) become integers again"""
+    if dtype == 'string':
+        return pd.Series(values, dtype=object).astype('string')
+    numbers = pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype('float64')
+    return np.trunc(numbers).astype('Int64') if dtype == 'Int64' else numbers
+
+
+def _arrow_column(name: str, values: list):
+    """a column straight to Arrow, which does the casting in C (None/NaN -> null, integer columns truncated through
+    float64 like int(float(x))); values Arrow won't take (e.g. numbers saved as text) go the slower pandas way"""
+    dtype, arrow_type = BUSINESS_DTYPES[name], ARROW_SCHEMA.field(name).type
+    try:
+        if dtype == 'Int64':
+            return pa.array(values, type=pa.float64(), from_pandas=True).cast(pa.int64(), safe=False)
+        return pa.array(values, type=arrow_type, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array(_typed_column(values, dtype), type=arrow_type, from_pandas=True)
+
+
 @dataclass
 class BusinessList:
     """holds list of Business objects,
@@ -79,22 +120,36 @@ class BusinessList:
     # NEW: Populate the seen set with any pre-loaded business_list
     def __post_init__(self):
         for business in self.business_list:
-            self._seen_businesses.add(hash(business))
+            self._seen_businesses.add(business.fingerprint())
 
     def add_business(self, business: Business):
         """Add a business to the list if it's not a duplicate based on key attributes"""
-        business_hash = hash(business)
+        business_hash = business.fingerprint()
         if business_hash not in self._seen_businesses:
             self.business_list.append(business)
             self._seen_businesses.add(business_hash)
             return True # Indicate that a new business was added
         return False # Indicate that a duplicate was found
     
+    def _raw_columns(self) -> dict:
+        """field name -> list of the values as they are in the objects"""
+        return {name: list(map(attrgetter(name), self.business_list)) for name in BUSINESS_DTYPES}
+
+    def columns(self) -> dict:
+        """column-oriented copy of business_list: field name -> Series of the column's type (cast a column at a time, not a cell at a time)"""
+        return {name: _typed_column(values, BUSINESS_DTYPES[name]) for name, values in self._raw_columns().items()}
+
     def dataframe(self):
-        """transform business_list to pandas dataframe"""
-        return pd.json_normalize(
-            (asdict(business) for business in self.business_list), sep="_"
-        )
+        """transform business_list to pandas dataframe, with explicit dtypes (reviews_count is Int64, not float or object)"""
+        return pd.DataFrame(self.columns())
+
+    def to_parquet(self, path: str):
+        """writes the list to a typed parquet file through Arrow (the columns go over as they are, no DataFrame in between)"""
+        if pa is None:
+            raise ImportError("The parquet export needs pyarrow: pip install pyarrow")
+        columns = self._raw_columns()
+        table = pa.table({name: _arrow_column(name, columns[name]) for name in ARROW_SCHEMA.names}, schema=ARROW_SCHEMA)
+        pq.write_table(table, path)
 
 #this part is quite useless now that we have a program to compute the exact location
 '''
@@ -112,16 +167,818 @@ def extract_coordinates_from_url(url: str) -> tuple[float, float]:
 # NOTE: The custom get_unique_filename function is removed
 # to ensure the file path is predictable for loading/overwriting.
 
+MAPS_URL = "https://www.google.com/maps"
+LISTING_XPATH = '//a[contains(@href, "https://www.google.com/maps/place")]'
+
+# --- Adaptive Waits ---
+#the old fixed pauses, in ms. They are still used as a fallback when a signal never arrives, and by --fixed-waits
+FIXED_DELAYS = {'type': 3000, 'search': 5000, 'idle': 0, 'scroll': 3000, 'click': 2000}
+#upper timeouts, in ms, for the signals we wait for instead of the pauses above ('type' has no signal, see after_typing)
+DEFAULT_WAIT_TIMEOUTS = {'search': 10000, 'idle': 2000, 'scroll': 3000, 'click': 2000}
+
+# counts the nodes matching an xpath directly in the page, so that polling doesn't cost a round-trip per check
+_XPATH_COUNT_JS = "(xpath) => document.evaluate(xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null).snapshotLength"
+# the href of the first listing in the page, or null
+_FIRST_HREF_JS = ("(xpath) => { const node = document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)"
+                  ".singleNodeValue; return node ? node.getAttribute('href') : null; }")
+
+
+@dataclass
+class WaitStats:
+    """records how long every wait actually took, grouped by stage"""
+    durations: dict = field(default_factory=dict)
+    fallbacks: dict = field(default_factory=dict)
+
+    def record(self, stage: str, seconds: float, fell_back: bool):
+        self.durations.setdefault(stage, []).append(seconds)
+        self.fallbacks[stage] = self.fallbacks.get(stage, 0) + int(fell_back)
+
+    def summary(self) -> dict:
+        """count, total, average and max seconds plus the number of fallbacks for every stage"""
+        return {
+            stage: {'count': len(values), 'total': sum(values), 'avg': sum(values) / len(values),
+                    'max': max(values), 'fallbacks': self.fallbacks.get(stage, 0)}
+            for stage, values in self.durations.items()
+        }
+
+
+@dataclass
+class WaitEngine:
+    """Waits for something that actually happens on the page instead of sleeping for a fixed time.
+    Every stage has an upper timeout; if the signal never shows up it falls back to the old fixed delay.
+    """
+    timeouts: dict = field(default_factory=lambda: dict(DEFAULT_WAIT_TIMEOUTS))
+    fixed: bool = False   # True means behaving exactly like before, only the fixed delays
+    stats: WaitStats = field(default_factory=WaitStats)
+
+    def fresh(self) -> 'WaitEngine':
+        """same settings, empty stats (one per search, so that every summary shows its own waits)"""
+        return WaitEngine(timeouts=self.timeouts, fixed=self.fixed)
+
+    async def _wait(self, page, stage: str, signal) -> bool:
+        """Runs signal(timeout_ms), records the time it took and returns whether the signal arrived."""
+        fallback = FIXED_DELAYS[stage]
+        started = time.perf_counter()
+        arrived = True
+        if self.fixed:
+            if fallback:
+                await page.wait_for_timeout(fallback)
+        else:
+            try:
+                await signal(self.timeouts[stage])
+            except PlaywrightTimeoutError:
+                # the signal never came: whatever is left of the old fixed delay is waited anyway
+                arrived = False
+                remaining = fallback - (time.perf_counter() - started) * 1000
+                if remaining > 0:
+                    await page.wait_for_timeout(remaining)
+        self.stats.record(stage, time.perf_counter() - started, not arrived)
+        return arrived
+
+    async def after_typing(self, page) -> bool:
+        """Nothing to wait for: fill() sets the whole value at once, Enter can follow straight away.
+        Only --fixed-waits keeps the old pause here."""
+        if self.fixed:
+            return await self._wait(page, 'type', None)
+        return True
+
+    async def first_listing(self, page):
+        """href of the first result in the page (None if there is none), to tell the next search's results from these"""
+        return await page.evaluate(_FIRST_HREF_JS, LISTING_XPATH)
+
+    async def after_search(self, page, previous_href: str = None) -> bool:
+        """The first result is in the page and it isn't the one of the previous search (previous_href, from first_listing
+        before pressing Enter: on the same page the old results are still attached until Maps replaces them),
+        then (best effort) the network calms down."""
+        async def results_replaced(timeout):
+            #the old first result changed or went away...
+            await page.wait_for_function(f"([xpath, previous]) => ({_FIRST_HREF_JS})(xpath) !== previous",
+                                         arg=[LISTING_XPATH, previous_href], timeout=timeout)
+            #...and the new ones are there (if this search has any)
+            await page.wait_for_selector(LISTING_XPATH, state='attached', timeout=timeout)
+
+        arrived = await self._wait(page, 'search', results_replaced)
+        await self._wait(page, 'idle', lambda timeout: page.wait_for_load_state('networkidle', timeout=timeout))
+        return arrived
+
+    async def after_scroll(self, page, previous_count: int) -> bool:
+        """the feed has more results than before the mouse wheel"""
+        return await self._wait(page, 'scroll', lambda timeout: page.wait_for_function(
+            f"(previous) => ({_XPATH_COUNT_JS})({LISTING_XPATH!r}) > previous", arg=previous_count, timeout=timeout))
+
+    async def after_click(self, page, previous_title: str = None) -> bool:
+        """the title of the detail pane (h1.DUwDvf) changed from the previous listing's one"""
+        return await self._wait(page, 'click', lambda timeout: page.wait_for_function(
+            "(previous) => { const h1 = document.querySelector('h1.DUwDvf');"
+            " return !!h1 && h1.innerText.trim() !== '' && h1.innerText.trim() !== previous; }",
+            arg=previous_title, timeout=timeout))
+
+
+# --- Detail Pane Extraction ---
+#what to read from the detail pane, one entry per Business field. Selectors starting with '/' are XPath, the others CSS;
+#when a field has more than one selector the first one found on the page wins (that's how the category fallback works).
+#If Google changes the page, this is the only place that needs editing
+DETAIL_SCHEMA = {
+    'name': {'selectors': ['h1.DUwDvf'], 'parser': 'text', 'required': True},
+    'address': {'selectors': ['//button[@data-item-id="address"]//div[contains(@class, "fontBodyMedium")]'], 'parser': 'text'},
+    'domain': {'selectors': ['//a[@data-item-id="authority"]//div[contains(@class, "fontBodyMedium")]'], 'parser': 'text'},
+    'phone_number': {'selectors': ['//button[contains(@data-item-id, "phone:tel:")]//div[contains(@class, "fontBodyMedium")]'], 'parser': 'text'},
+    'reviews_count': {'selectors': ['//div[@jsaction="pane.reviewChart.moreReviews"]//span'], 'parser': 'int'},
+    'reviews_average': {'selectors': ['//div[@jsaction="pane.reviewChart.moreReviews"]//div[@role="img"]'], 'attribute': 'aria-label', 'parser': 'float'},
+    'plus_code': {'selectors': ['//button[@data-item-id="oloc"]//div[contains(@class, "fontBodyMedium")]'], 'parser': 'text'},
+    #the second selector is the fallback: the text right after the name, which is often the category if the structured element isn't found
+    'category': {'selectors': ['//button[contains(@jsaction, "pane.place.category")]//div[contains(@class, "fontBodyMedium")]',
+                               '//div[@class="fontBodyMedium"]/span'], 'parser': 'text'},
+}
+
+#runs inside the browser: reads every field of the schema in one go, so a listing costs one round-trip instead of ~20
+_EXTRACT_JS = """(schema) => {
+    const first = (selector) => selector.startsWith('/')
+        ? document.evaluate(selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+        : document.querySelector(selector);
+    const out = {};
+    for (const [name, spec] of Object.entries(schema)) {
+        out[name] = null;
+        for (const selector of spec.selectors) {
+            const node = first(selector);
+            if (!node) continue;
+            out[name] = spec.attribute ? node.getAttribute(spec.attribute) : node.innerText;
+            break;
+        }
+    }
+    return out;
+}"""
+
+
+def _parse_text(value: str):
+    return value.strip() or None
+
+def _parse_int(value: str):
+    return int(value.split()[0].strip('()').replace(',', '').strip())     # '1,234 reviews' or '(1,234)' -> 1234
+
+def _parse_float(value: str):
+    return float(value.split()[0].replace(',', '.').strip())  # '4,5 stars' -> 4.5
+
+PARSERS = {'text': _parse_text, 'int': _parse_int, 'float': _parse_float}
+
+
+def parse_fields(raw: dict, schema: dict = DETAIL_SCHEMA, metrics: RunMetrics = None) -> dict:
+    """Turns the raw strings read by _EXTRACT_JS into values ready for Business(**fields).
+    A value that can't be parsed becomes None, a missing required field raises ValueError.
+    With metrics, both are counted by field (and the parsing errors by exception type)."""
+    fields = {}
+    for name, spec in schema.items():
+        value = raw.get(name)
+        if value is None:
+            if metrics:
+                metrics.miss(name)
+        else:
+            try:
+                value = PARSERS[spec.get('parser', 'text')](value)
+            except (ValueError, IndexError) as e:
+                if metrics:
+                    metrics.failure(name, e)
+                value = None
+        if value is None and spec.get('required'):
+            raise ValueError(f"Required field '{name}' not found in the detail pane")
+        fields[name] = value
+    # the website is not on the page as such, it is built from the domain shown in the pane
+    if 'domain' in fields:
+        fields['website'] = f"https://www.{fields['domain']}" if fields['domain'] else None
+    return fields
+
+
+def _js_schema(schema: dict) -> dict:
+    """the part of a schema the browser needs (the parsers stay in python)"""
+    return {name: {'selectors': spec['selectors'], 'attribute': spec.get('attribute')} for name, spec in schema.items()}
+
+
+async def extract_business(page, schema: dict = DETAIL_SCHEMA, metrics: RunMetrics = None) -> Business:
+    """Reads the open detail pane into a Business with a single page.evaluate call."""
+    raw = await page.evaluate(_EXTRACT_JS, _js_schema(schema))
+    return Business(**parse_fields(raw, schema, metrics))
+
+
+# --- Result Cards ---
+#what the cards of the results list show without clicking, CSS selectors relative to the card (the parent of the listing anchor)
+CARD_SCHEMA = {
+    'name': {'selectors': ['a[href*="/maps/place"]'], 'attribute': 'aria-label', 'parser': 'text'},
+    'reviews_average': {'selectors': ['span.MW4etd'], 'parser': 'float'},
+    'reviews_count': {'selectors': ['span.UY7F9'], 'parser': 'int'},
+}
+
+#on a place already scraped these are taken from the card, everything else from the index (the name stays the stored one, so its hash doesn't change)
+CARD_REFRESH_FIELDS = ('reviews_average', 'reviews_count')
+
+#runs inside the browser: for every listing anchor, its href and the card fields, all in one round-trip
+_HARVEST_JS = """([listingXpath, schema]) => {
+    const anchors = document.evaluate(listingXpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    const cards = [];
+    for (let i = 0; i < anchors.snapshotLength; i++) {
+        const anchor = anchors.snapshotItem(i);
+        const card = anchor.parentElement;
+        const fields = {};
+        for (const [name, spec] of Object.entries(schema)) {
+            fields[name] = null;
+            for (const selector of spec.selectors) {
+                const node = card.querySelector(selector);
+                if (!node) continue;
+                fields[name] = spec.attribute ? node.getAttribute(spec.attribute) : node.innerText;
+                break;
+            }
+        }
+        cards.push({href: anchor.href, fields: fields});
+    }
+    return cards;
+}"""
+
+
+async def harvest_cards(page, schema: dict = CARD_SCHEMA) -> list[dict]:
+    """[{'href': ..., 'fields': {...}}] for every listing currently in the results list, in page order"""
+    return await page.evaluate(_HARVEST_JS, [LISTING_XPATH, _js_schema(schema)])
+
+
+#with the network engine a listing is clicked only if its response record misses one of these
+NETWORK_REQUIRED_FIELDS = ('name', 'address')
+
+
+def merge_business(clicked: Business, known: dict = None) -> Business:
+    """the detail pane wins, the fields it didn't have are filled from the response record"""
+    for name, value in (known or {}).items():
+        if value is not None and getattr(clicked, name) is None:
+            setattr(clicked, name, value)
+    return clicked
+
+
+# --- Scraping of a single query ---
+STORE_FILENAME = 'scrape_store.sqlite'   #lives next to the exported files, in GMaps Data/<date>/
+
+DEDUPE_INDEX_PATH = os.path.join(os.path.dirname(BusinessList.save_at), 'dedupe_index.sqlite')   #GMaps Data/, shared by every day
+
+
+def load_query(base_filename: str, store: QueryStore = None) -> BusinessList:
+    """The records of a search saved so far today. They come from the store; the exported csv is only
+    read for searches scraped before the store existed."""
+    stored = store.businesses(base_filename) if store else []
+    if not stored:
+        return BusinessList(business_list=load_existing_data(base_filename, BusinessList.save_at)) #that save_at is the jointure of 'GMapsData, today', it is an attribute of the BusinessList
+    business_list = BusinessList()
+    for fields in stored:
+        business_list.add_business(Business(**fields))
+    return business_list
+
+
+EXPORT_FORMATS = ('csv', 'parquet', 'xlsx')
+
+
+def export_query(business_list: BusinessList, base_filename: str, formats: tuple = ('csv',)) -> str:
+    """Export step: writes the files of a search in the given formats (overwriting them with the complete list)
+    and returns the path of the first one. The csv is the one load_existing_data reads back, the xlsx is opt-in since it's by far the slowest."""
+    paths = {export_format: os.path.join(BusinessList.save_at, f"{base_filename}.{export_format}") for export_format in formats}
+    if 'parquet' in paths:
+        business_list.to_parquet(paths['parquet'])
+    if 'csv' in paths or 'xlsx' in paths:
+        df = business_list.dataframe() #built once, used for both files
+        if 'xlsx' in paths:
+            df.to_excel(paths['xlsx'], index=False)
+        if 'csv' in paths:
+            df.to_csv(paths['csv'], index=False)
+    return paths[formats[0]]
+
+
+#everything the old main() did inside the 'for search_for in search_list' loop now lives here, so that every worker can call it on its own page
+async def scrape_query(page, search_for: str, search_for_index: int, total: int, waits: WaitEngine = None,
+                       engine: str = 'click', record_responses: str = None, store: QueryStore = None,
+                       index: DedupeIndex = None, skip_known: bool = True, formats: tuple = ('csv',),
+                       business_list: BusinessList = None, tile_url: str = None, key_prefix: str = '', export: bool = True,
+                       done: set = None, seen: set = None) -> dict:
+    """Scrapes one search on an already opened page, saves the files and returns a small summary.
+
+    engine='click' opens every listing, engine='network' reads the search responses while scrolling and only
+    clicks the listings whose record is missing (or misses one of NETWORK_REQUIRED_FIELDS).
+    With a store every new business is written to disk as soon as it is accepted, and the listings already
+    done in a previous (crashed) run of the same search are skipped.
+    With an index every business is also remembered across searches and days; 'seen_before' in the summary counts
+    the ones another search (or day) had already scraped. With skip_known the listings whose place id is already
+    in the index aren't even clicked: their stored record is reused, refreshed with what the result card shows.
+    For one tile of a sharded search (see ShardedSearch) tile_url is opened instead of typing the search, the
+    businesses go into the business_list shared by all the tiles and nothing is exported (export=False); done is then
+    the checkpoints taken before the run started, and seen the listings the other tiles have already handled in this run.
+    summary['metrics'] holds the RunMetrics of the search (stage timings, fields that failed, listings given up).
+    """
+    started = time.perf_counter()
+    waits = (waits or WaitEngine()).fresh()
+    metrics = RunMetrics()
+    print(f"-----\n{search_for_index} - {search_for}" + (f" @ {tile_url}" if tile_url else ''))    #the n here is used to go to the next line 
+
+    # Prepare the base filename from the search term
+    base_filename = search_for.replace(' ', '_')         # 'trois et quatre' becomes trois_et_quatre
+
+    # --- NEW: Load existing data and initialize BusinessList ---
+    #reading the csv is blocking, so it goes to a thread and the other workers can keep scrolling in the meantime
+    if business_list is None:
+        business_list = await asyncio.to_thread(load_query, base_filename, store)
+    initial_count = len(business_list.business_list)
+
+    collector = None
+    if engine == 'network':
+        collector = ResponseCollector(record_dir=os.path.join(record_responses, base_filename) if record_responses else None)
+        page.on("response", collector.on_response) #from now on every search response is parsed while we keep scrolling
+    try:
+        counts = await _scrape_listings(page, search_for, base_filename, total, waits, business_list, collector, store,
+                                        index, skip_known, tile_url, key_prefix, metrics, done, seen)
+    finally:
+        if collector:
+            page.remove_listener("response", collector.on_response)
+
+    summary = {'search': search_for, 'previously_saved': initial_count, 'total': len(business_list.business_list),
+               'file': None, 'waits': waits.stats.summary(), 'metrics': metrics, **counts}
+    if counts['listings'] and export:
+        # --- Output (Modified to overwrite existing file with the complete list) ---
+        #writing the excel is slow, so it runs in a thread and doesn't freeze the other workers
+        with metrics.time('export'):
+            summary['file'] = await asyncio.to_thread(export_query, business_list, base_filename, formats)
+    summary['seconds'] = time.perf_counter() - started
+    summary['listings_per_min'] = (counts['listings'] - counts['resumed'] - counts['overlaps']) / summary['seconds'] * 60
+    return summary
+
+
+async def _scrape_listings(page, search_for: str, base_filename: str, total: int, waits: WaitEngine,
+                           business_list: BusinessList, collector: ResponseCollector = None, store: QueryStore = None,
+                           index: DedupeIndex = None, skip_known: bool = True, tile_url: str = None, key_prefix: str = '',
+                           metrics: RunMetrics = None, done: set = None, seen: set = None) -> dict:
+    """Searches (or opens the search url of a tile), scrolls and scrapes the listings into business_list, returns the counts for the summary.
+    Every stage is timed in metrics: search, scroll (each iteration), harvest, click, extract, save and listing (the whole listing,
+    listing_known for the ones reused from the dedupe index without a click, which take a fraction of the time)."""
+    metrics = metrics if metrics is not None else RunMetrics()
+    counts = {'listings': 0, 'new': 0, 'clicks': 0, 'from_responses': 0, 'resumed': 0, 'overlaps': 0, 'seen_before': 0,
+              'clicks_avoided': 0}
+
+    # Perform the search
+    with metrics.time('search'):
+        previous_href = None
+        if tile_url:
+            await page.goto(tile_url, timeout=20000)   #the url searches the term inside the tile's viewport (a new page, nothing left of the old results)
+        else:
+            previous_href = await waits.first_listing(page)   #the previous search's results are still in the page
+            await page.locator('input[name="q"]').fill(search_for)
+            await waits.after_typing(page)
+            await page.keyboard.press("Enter")
+        await waits.after_search(page, previous_href)
+    if not await page.locator(LISTING_XPATH).count():
+        #nothing to scroll (common for the tiles over a park or a lake), hovering would only time out
+        print(f"No listings found for {search_for}. Moving to next search.")
+        return counts
+    # scrolling
+    await page.hover(LISTING_XPATH) #move the mouse cursor over a web element to trigger its hover state (like revealing a dropdown menu or changing its color) without clicking it.
+
+    listings = []
+    cards = []
+    previously_counted = 0
+    while True:
+        with metrics.time('scroll'):
+            await page.mouse.wheel(0, 10000) #literally scrolling the mouse wheel
+            await waits.after_scroll(page, previously_counted)
+
+            #hrefs and card fields of everything loaded so far, in the same round-trip that used to only count the listings
+            with metrics.time('harvest'):
+                cards = await harvest_cards(page)
+        listings_count = len(cards)
+        
+        if listings_count >= total:
+            cards = cards[:total]
+            listings = (await page.locator(LISTING_XPATH).all())[:total] #Playwright method takes the locator and immediately collects a list of all matching elements currently visible in the Document Object Model (DOM)
+            listings = [listing.locator("xpath=..") for listing in listings]
+            print(f"[{search_for}] Total Scraped: {len(listings)}")
+            break
+        else:
+            if listings_count == previously_counted:
+                listings = await page.locator(LISTING_XPATH).all()
+                print(f"[{search_for}] Arrived at all available\nTotal Scraped: {len(listings)}")
+                break
+            else:
+                previously_counted = listings_count
+                print(f"[{search_for}] Currently Scraped: {listings_count}", end='\r')
+
+    # NEW: Check if listings is non-empty
+    if not listings:
+        print(f"No listings found for {search_for}. Moving to next search.")
+        return counts
+    counts['listings'] = len(listings)
+
+    if collector:
+        await collector.drain()
+    if done is None:
+        done = store.done_keys(base_filename) if store else set()
+
+    # scraping
+    previous_title = None
+    for position, listing in enumerate(listings):
+        #the href has the place id that links a listing to its response record, its checkpoint and the dedupe index
+        place_id = place_id_from_href(cards[position]['href']) if position < len(cards) else None
+        listing_key = place_id or f"{key_prefix}#{position}"
+        if listing_key in done:
+            counts['resumed'] += 1   #already handled by a previous run of this search
+            continue
+        if seen is not None and listing_key in seen:
+            counts['overlaps'] += 1   #another tile of the same search found it in this run (tiles overlap at the edges)
+            continue
+        listing_started = time.perf_counter()
+        stage = 'lookup'   #what the listing was doing, for the error counters
+        stored = None
+        try:                        
+            stored = index.get(f"place:{place_id}") if index and skip_known and place_id else None
+            known = collector.get(place_id) if collector else None
+            if known and index and not all(known.get(name) is not None for name in NETWORK_REQUIRED_FIELDS):
+                #the response is incomplete, but if we scraped this place before the index has the rest
+                known = {**(index.get(business_fingerprint(known)) or {}), **{k: v for k, v in known.items() if v is not None}}
+            if stored:
+                #scraped before: no click, only the rating and the reviews may have changed and the card shows them
+                card = parse_fields(cards[position]['fields'], CARD_SCHEMA)
+                business = Business(**{**stored, **{k: card[k] for k in CARD_REFRESH_FIELDS if card.get(k) is not None}})
+                counts['clicks_avoided'] += 1
+            elif known and all(known.get(name) is not None for name in NETWORK_REQUIRED_FIELDS):
+                business = Business(**known)   #everything we need came with the response, no click
+                counts['from_responses'] += 1
+            else:
+                stage = 'click'
+                with metrics.time('click'):
+                    await listing.click()
+                    await waits.after_click(page, previous_title)
+                stage = 'extract'
+                with metrics.time('extract'):
+                    business = merge_business(await extract_business(page, metrics=metrics), known)
+                previous_title = business.name
+                counts['clicks'] += 1
+            business.location = search_for.split(' in ')[-1].strip() if ' in ' in search_for else None
+            #business.latitude, business.longitude = extract_coordinates_from_url(page.url)
+
+            # NEW: Add business and track if it was new
+            stage = 'save'
+            with metrics.time('save'):
+                added = business_list.add_business(business)
+                if added:
+                    counts['new'] += 1
+                if index and not index.add(asdict(business), query=base_filename, place_id=place_id):
+                    counts['seen_before'] += 1   #another search (or day) had it already
+                if store:
+                    #straight to disk: the business (if new) and the checkpoint, a crash after this line loses nothing
+                    store.record(base_filename, listing_key, asdict(business) if added else None)
+            if seen is not None:
+                seen.add(listing_key)
+                
+        except Exception as e:
+            #on its own line (with '\r' the next one used to overwrite it), and counted by stage and exception type
+            metrics.error(stage, e)
+            print(f"[{search_for}] Listing {position} failed at '{stage}': {type(e).__name__}: {e}")
+        metrics.record('listing_known' if stored else 'listing', time.perf_counter() - listing_started)
+
+    return counts
+
+
+def print_summary(summary: dict):
+    """Prints the per query report (same lines as before, plus the time it took)."""
+    print(f"\n--- Update Summary for '{summary['search']}' ---")
+    print(f"Records previously saved: {summary['previously_saved']}")
+    print(f"New unique records added: {summary['new']}")
+    print(f"Total records in file: {summary['total']}")
+    print(f"File updated: {summary['file']}")
+    print(f"Time taken: {summary['seconds']:.1f}s ({summary.get('listings_per_min', 0):.1f} listings/min)")
+    print(f"Listings clicked: {summary.get('clicks', 0)}, read from responses: {summary.get('from_responses', 0)}, "
+          f"already done in a previous run: {summary.get('resumed', 0)}"
+          + (f", found by another tile: {summary['overlaps']}" if summary.get('overlaps') else ''))
+    print(f"Already scraped by another search or day: {summary.get('seen_before', 0)}, "
+          f"clicks avoided thanks to the index: {summary.get('clicks_avoided', 0)}")
+    if 'shards' in summary:
+        shards = summary['shards']
+        print(f"Tiles: {shards['planned']} planned, {shards['scraped']} scraped, {shards['split']} split, "
+              f"{shards['resumed']} done in a previous run, {shards['failed']} failed, max depth {shards['max_depth']}, "
+              f"{shards['saturated_leaves']} still at the cap" + (f", {shards['deferred']} left for the next run" if shards.get('deferred') else ''))
+    if 'traffic' in summary:
+        traffic = summary['traffic']
+        print(f"Traffic: {traffic['bytes'] / 1_048_576:.1f} MB in {traffic['requests']} requests, {traffic['blocked']} blocked")
+    for stage, stats in summary.get('waits', {}).items():
+        print(f"  wait '{stage}': {stats['count']}x, avg {stats['avg']:.2f}s, max {stats['max']:.2f}s, "
+              f"total {stats['total']:.1f}s, fallbacks {stats['fallbacks']}")
+    if summary.get('metrics'):
+        metrics = summary['metrics'].summary()
+        for stage, stats in metrics['stages'].items():
+            print(f"  stage '{stage}': {stats['count']}x, avg {stats['avg']:.2f}s, p90 {stats['p90']:.2f}s, "
+                  f"max {stats['max']:.2f}s, total {stats['total']:.1f}s")
+        breakdown = time_breakdown(metrics['stages'], summary.get('waits', {}))
+        print(f"Time waiting for the page: {breakdown['waits']:.1f}s, reading the page: {breakdown['dom']:.1f}s, "
+              f"saving: {breakdown['io']:.1f}s")
+        if metrics['failures'] or metrics['errors']:
+            print(f"Fields not parsed: {metrics['failures'] or 'none'}, listings failed: {metrics['errors'] or 'none'}")
+
+
+# --- Browser Profiles ---
+#'default' is the old behaviour (visible browser, everything loaded), 'lean' is for servers: headless and without
+#images, map tiles, fonts and media, none of which we read
+BROWSER_PROFILES = {
+    'default': {'headless': False, 'block': False, 'context': {'locale': 'en-GB'}},
+    'lean': {'headless': True, 'block': True,
+             'context': {'locale': 'en-GB', 'viewport': {'width': 1280, 'height': 900}, 'device_scale_factor': 1}},
+}
+#allowlist: with blocking on, only these resource types are loaded...
+ALLOWED_RESOURCE_TYPES = {'document', 'script', 'xhr', 'fetch', 'stylesheet'}
+#...and not even those when the url is a map tile or a static map
+BLOCKED_URL_MARKERS = ('/maps/vt', 'khms', 'streetviewpixels', 'staticmap')
+
+
+class TrafficMeter:
+    """Counts the bytes transferred and the requests blocked on a context, reset at the start of every search."""
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.bytes = 0
+        self.requests = 0
+        self.blocked = 0
+
+    async def route(self, route):
+        request = route.request
+        if request.resource_type not in ALLOWED_RESOURCE_TYPES or any(marker in request.url for marker in BLOCKED_URL_MARKERS):
+            self.blocked += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def on_request_finished(self, request):
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return   # the page went away before we could ask
+        self.requests += 1
+        self.bytes += (sizes['requestHeadersSize'] + sizes['requestBodySize']
+                       + sizes['responseHeadersSize'] + sizes['responseBodySize'])
+
+    def snapshot(self) -> dict:
+        return {'bytes': self.bytes, 'requests': self.requests, 'blocked': self.blocked}
+
+
+# --- Sharded Searches ---
+def _merge_waits(total: dict, waits: dict):
+    """adds the wait stats of one tile to the ones of the whole search"""
+    for stage, stats in waits.items():
+        merged = total.setdefault(stage, {'count': 0, 'avg': 0.0, 'max': 0.0, 'total': 0.0, 'fallbacks': 0})
+        merged['count'] += stats['count']
+        merged['total'] += stats['total']
+        merged['max'] = max(merged['max'], stats['max'])
+        merged['fallbacks'] += stats['fallbacks']
+        merged['avg'] = merged['total'] / merged['count'] if merged['count'] else 0.0
+
+
+class ShardedSearch:
+    """One search split into tiles (see Tiling.py). Every tile is a separate item of the worker queue, so they are
+    scraped by whichever worker is free; the businesses of all the tiles go into one BusinessList, whose hash dedupe
+    merges the places found by more than one tile. When the last tile comes back the search is exported once."""
+    def __init__(self, search_for: str, plan: ShardPlan, store: QueryStore = None, formats: tuple = ('csv',)):
+        self.search_for = search_for
+        self.base_filename = search_for.replace(' ', '_')
+        self.term = search_term(search_for)
+        self.plan = plan
+        self.store = store
+        self.formats = formats
+        self.business_list = load_query(self.base_filename, store)
+        self.previously_saved = len(self.business_list.business_list)
+        #the checkpoints of the previous runs, taken once: what the tiles of this run add goes in seen instead,
+        #so a place found by two tiles isn't counted as resumed
+        self.done = store.done_keys(self.base_filename) if store else set()
+        self.seen = set()
+        self.counts = {}
+        self.waits = {}
+        self.metrics = RunMetrics()
+        self.traffic = {'bytes': 0, 'requests': 0, 'blocked': 0}
+        self.started = time.perf_counter()
+
+    async def finished(self, tile: Tile, shard_summary: dict, queue: asyncio.Queue, search_for_index: int) -> dict:
+        """Books a tile (shard_summary=None if it failed), queues its quadrants if it was saturated, and returns
+        the summary of the whole search once every tile is done (None before that)."""
+        result_count = shard_summary['listings'] if shard_summary else None
+        checkpoint, children = self.plan.finished(tile, result_count)
+        if shard_summary:
+            for key in ('listings', 'new', 'clicks', 'from_responses', 'resumed', 'overlaps', 'seen_before', 'clicks_avoided'):
+                self.counts[key] = self.counts.get(key, 0) + shard_summary.get(key, 0)
+            _merge_waits(self.waits, shard_summary.get('waits', {}))
+            if shard_summary.get('metrics'):
+                self.metrics.merge(shard_summary['metrics'])
+            for key, value in shard_summary.get('traffic', {}).items():
+                self.traffic[key] += value
+            print(f"[{self.search_for}] tile {tile.key} (depth {tile.depth}): {result_count} results"
+                  + (", split in 4" if children else '') + f", {self.plan.pending} tiles pending")
+        if checkpoint and self.store:
+            self.store.record(self.base_filename, checkpoint)   #a resumed run starts from the tiles still missing
+        for child in children:
+            queue.put_nowait((search_for_index, self.search_for, child))
+        if not self.plan.complete:
+            return None
+        return await self.export()
+
+    async def export(self) -> dict:
+        summary = {'search': self.search_for, 'previously_saved': self.previously_saved,
+                   'total': len(self.business_list.business_list), 'file': None, 'waits': self.waits,
+                   'traffic': self.traffic, 'shards': self.plan.stats, 'metrics': self.metrics, **self.counts}
+        summary.setdefault('new', 0)
+        if self.business_list.business_list:
+            with self.metrics.time('export'):
+                summary['file'] = await asyncio.to_thread(export_query, self.business_list, self.base_filename, self.formats)
+        summary['seconds'] = time.perf_counter() - self.started
+        handled = summary.get('listings', 0) - summary.get('resumed', 0) - summary.get('overlaps', 0)
+        summary['listings_per_min'] = handled / summary['seconds'] * 60
+        return summary
+
+
+# --- Worker Pool ---
+#every worker owns an isolated browser context (its own cookies, cache and tabs), so the searches don't step on each other
+async def worker(worker_id: int, browser, queue: asyncio.Queue, total: int, url: str, summaries: list, scrape_options: dict,
+                 profile: str = 'default', shards: dict = None, report: RunReport = None):
+    """Takes (index, search, tile) items from the queue until it gets None, one at a time, on its own context.
+    tile is None for a plain search, otherwise it's one tile of the ShardedSearch shards[search].
+    Every finished (or failed) search is also written to report.
+    scrape_options are passed as they are to scrape_query (waits, engine, ...)."""
+    settings = BROWSER_PROFILES[profile]
+    viewport = settings['context'].get('viewport', {'width': 1280, 'height': 720})   #playwright's default when the profile doesn't set one
+    viewport = (viewport['width'], viewport['height'])
+    context = await browser.new_context(**settings['context'])
+    meter = TrafficMeter()
+    if settings['block']:
+        await context.route("**/*", meter.route) #every request goes through the allowlist first
+    page = await context.new_page()
+    page.on("requestfinished", meter.on_request_finished)
+    await page.goto(url, timeout=20000)
+    try:
+        while True:
+            item = await queue.get()   #the queue stays open while tiles may still be split into new ones
+            if item is None:
+                queue.task_done()
+                break #nothing left to do for this worker
+            search_for_index, search_for, tile = item
+            try:
+                meter.reset()
+                if tile is None:
+                    summary = await scrape_query(page, search_for, search_for_index, total, **scrape_options)
+                    summary['traffic'] = meter.snapshot()
+                else:
+                    sharded = shards[search_for]
+                    try:
+                        shard_summary = await scrape_query(page, search_for, search_for_index, total,
+                                                           business_list=sharded.business_list, tile_url=tile.url(sharded.term, url, viewport),
+                                                           key_prefix=tile.key, export=False, done=sharded.done,
+                                                           seen=sharded.seen, **scrape_options)
+                        shard_summary['traffic'] = meter.snapshot()
+                    except Exception as e:
+                        print(f"[worker {worker_id}] Tile {tile.key} of '{search_for}' failed: {e}")
+                        if report:
+                            report.failed(f"{search_for} @ {tile.key}", e)
+                        shard_summary = None
+                    #booked before anything else can go wrong: a tile never booked keeps the search from being exported
+                    summary = await sharded.finished(tile, shard_summary, queue, search_for_index)
+                    if shard_summary is None:
+                        try:
+                            await page.goto(url, timeout=20000)
+                        except Exception as e:
+                            print(f"[worker {worker_id}] Could not reload {url} after the failed tile: {e}")
+                if summary:
+                    summaries.append(summary)
+                    print_summary(summary)
+                    if report:
+                        report.search(summary)
+            except Exception as e:
+                # One broken query must not kill the worker, the others in the queue still have to run
+                print(f"[worker {worker_id}] Query '{search_for}' failed: {e}")
+                if report:
+                    report.failed(search_for, e)
+                try:
+                    await page.goto(url, timeout=20000)
+                except Exception as e:
+                    #the page is likely what broke the query: the worker goes on, the next query retries it
+                    print(f"[worker {worker_id}] Could not reload {url} after the failed query: {e}")
+            finally:
+                queue.task_done()
+    finally:
+        await context.close()
+
+
+async def run(search_list: list[str], total: int, workers: int = 1, browsers: int = 1, url: str = MAPS_URL,
+              profile: str = 'default', plans: dict = None, report: RunReport = None, **scrape_options) -> list[dict]:
+    """Spreads the searches over 'workers' contexts, which are shared round robin among 'browsers' chromium processes.
+    profile is one of BROWSER_PROFILES, plans maps the searches to shard by tiles to their ShardPlan, report (if any)
+    gets every search and the totals of the run, the remaining keyword arguments go to scrape_query."""
+    plans = plans or {}
+    shards = {}
+    summaries = []
+    queue = asyncio.Queue()
+    for search_for_index, search_for in enumerate(search_list):    #this gets you access to the index of each element in a list for i, value in enumerate(my_list):
+        if search_for not in plans:
+            queue.put_nowait((search_for_index, search_for, None))
+            continue
+        sharded = shards[search_for] = ShardedSearch(search_for, plans[search_for], scrape_options.get('store'),
+                                                     scrape_options.get('formats', ('csv',)))
+        tiles = sharded.plan.initial()
+        if not tiles:   #every tile was done by a previous run, only the export is left
+            summary = await sharded.export()
+            summaries.append(summary)
+            print_summary(summary)
+            if report:
+                report.search(summary)
+        for tile in tiles:
+            queue.put_nowait((search_for_index, search_for, tile))
+
+    workers = max(1, min(workers, queue.qsize())) #no point opening more contexts than there are searches (or tiles)
+    if queue.empty():
+        if report:
+            report.finish(0)
+        return summaries
+    browsers = max(1, min(browsers, workers))
+    started = time.perf_counter()
+
+    async def close_when_done():
+        await queue.join()   #every search and every tile, including the ones added by splitting, is done
+        for _ in range(workers):
+            queue.put_nowait(None)
+
+    async with async_playwright() as p:
+        #If headless=True, the browser runs in the background (faster for scraping)
+        browser_pool = [await p.chromium.launch(headless=BROWSER_PROFILES[profile]['headless']) for _ in range(browsers)]
+        await asyncio.gather(close_when_done(), *(
+            worker(i, browser_pool[i % browsers], queue, total, url, summaries, scrape_options, profile, shards, report) for i in range(workers)
+        ))
+        for browser in browser_pool:
+            await browser.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"\n===== {len(summaries)}/{len(search_list)} searches done with {workers} worker(s) in {elapsed:.1f}s "
+          f"({len(search_list) / elapsed * 60:.2f} searches/min) =====")
+    print(f"Clicks avoided on places already scraped: {sum(summary.get('clicks_avoided', 0) for summary in summaries)}")
+    if report:
+        totals = report.finish(workers)
+        breakdown = totals['breakdown']
+        print(f"{totals['listings']} listings at {totals['listings_per_min']:.1f}/min; waiting {breakdown['waits']:.1f}s, "
+              f"reading the page {breakdown['dom']:.1f}s, saving {breakdown['io']:.1f}s (report: {report.jsonl_path})")
+    return summaries
+
+
 # --- Main Function ---
 #this has nothing to do with classes, it's just a variable you are passing and applying methods on 
 def main():
     parser = argparse.ArgumentParser() #this create a variable with the argparse method ArgumentParser() this way you can store values in it 
     parser.add_argument("-s", "--search", type=str) #adding options to parse values 
     parser.add_argument("-t", "--total", type=int)
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of searches scraped at the same time, each in its own browser context")
+    parser.add_argument("-b", "--browsers", type=int, default=1, help="Number of chromium processes the workers are spread across")
+    parser.add_argument("-u", "--url", type=str, default=MAPS_URL, help="Maps page to open, point it to a local copy to measure the scaling offline")
+    parser.add_argument("--fixed-waits", action="store_true", help="Use the old fixed pauses instead of waiting for page signals")
+    parser.add_argument("--wait", action="append", default=[], metavar="STAGE=MS",
+                        help=f"Upper timeout of a wait stage, e.g. --wait scroll=5000 (stages: {', '.join(DEFAULT_WAIT_TIMEOUTS)})")
+    parser.add_argument("-e", "--engine", choices=["click", "network"], default="click",
+                        help="'network' reads the places from the search responses and clicks only the listings missing data")
+    parser.add_argument("--record-responses", type=str, default=None, metavar="DIR",
+                        help="With the network engine, save the raw search responses here (to re-parse them offline with ResponseParser.py)")
+    parser.add_argument("-p", "--profile", choices=list(BROWSER_PROFILES), default="default",
+                        help="'lean' runs headless and blocks images, map tiles, fonts and media")
+    parser.add_argument("--restart", action="store_true", help="Forget today's checkpoints of these searches and scrape them from the first listing")
+    parser.add_argument("--export-only", action="store_true", help="Don't scrape, just write the .xlsx/.csv of today's stored searches")
+    parser.add_argument("--rescrape-known", action="store_true", help="Click also the places already in the dedupe index (slower, refreshes every field)")
+    parser.add_argument("-x", "--formats", type=str, default="csv",
+                        help=f"Comma separated export formats among {', '.join(EXPORT_FORMATS)} (e.g. csv,parquet,xlsx)")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Split the area of every search in map tiles, each searched on its own, to get past the ~120 results cap")
+    parser.add_argument("--bbox", type=str, default=None, metavar="S,W,N,E",
+                        help="With --tiles, the area to cover (default: the bounding box of the place after ' in ', from Nominatim)")
+    parser.add_argument("--tile-km", type=float, default=2.0, help="With --tiles, side of the initial tiles")
+    parser.add_argument("--tile-cap", type=int, default=RESULT_CAP, help="With --tiles, results after which a tile is split in four")
+    parser.add_argument("--max-depth", type=int, default=3, help="With --tiles, how many times a tile can be split")
+    parser.add_argument("--max-shards", type=int, default=None, help="With --tiles, at most this many tiles per search (bounds the run time)")
+    parser.add_argument("--report", type=str, default=os.path.join(BusinessList.save_at, 'run_report.jsonl'),
+                        help="JSON lines file that gets one line per search and one per run, with stage timings and failure counters")
+    parser.add_argument("--prom", type=str, default=os.path.join(BusinessList.save_at, 'run_metrics.prom'),
+                        help="Prometheus textfile with the metrics of the run (point it to the node_exporter textfile directory)")
+    parser.add_argument("--profiler", choices=["cprofile", "pyinstrument"], default=None, help="Profile the whole run")
+    parser.add_argument("--profile-output", type=str, default=None,
+                        help="Where the profile goes (default: run.prof for cprofile, run_profile.html for pyinstrument)")
     args = parser.parse_args()        #it's taking the search information from the parser (total, search) (parse the command-line arguments and store them in the 'args' variable)
     
+    formats = tuple(dict.fromkeys(export_format.strip().lower() for export_format in args.formats.split(',') if export_format.strip()))
+    if not formats or any(export_format not in EXPORT_FORMATS for export_format in formats):
+        parser.error(f"--formats expects a comma separated list among {', '.join(EXPORT_FORMATS)}, got '{args.formats}'")
+    if 'parquet' in formats and pa is None:
+        parser.error("The parquet export needs pyarrow: pip install pyarrow")
+
+    #the sqlite store of today's folder, every search and every worker writes there as it goes
+    store = QueryStore(os.path.join(BusinessList.save_at, STORE_FILENAME))
+    index = DedupeIndex(DEDUPE_INDEX_PATH) #and the one of the whole GMaps Data folder, shared across days
+    if args.export_only:
+        queries = [args.search.strip().replace(' ', '_')] if args.search else store.queries()
+        for base_filename in queries:
+            business_list = load_query(base_filename, store)
+            print(f"Exported {len(business_list.business_list)} records to {export_query(business_list, base_filename, formats)}")
+        store.close()
+        index.close()
+        return
+
     if args.search:
-        search_list = [args.search]
+        search_list = [args.search.strip()]
         
     if args.total:
         total = args.total
@@ -135,175 +992,55 @@ def main():
         if os.path.exists(input_file_path):
             with open(input_file_path, 'r') as file:
                 search_list = file.readlines()
+        # Clean the search terms and drop blanks and repeated ones: two workers writing the same file at once would overwrite each other
+        search_list = list(dict.fromkeys(search.strip() for search in search_list if search.strip()))
         if len(search_list) == 0:
             print('Error occurred: You must either pass the -s search argument, or add searches to input.txt')
             sys.exit() #this will stop the program right there with no further lines of code running 
 #with is a context manager that ensures resources (like files) are properly cleaned up after you’re done, which prevents errors or memory leaks
     
-    with sync_playwright() as p:
-        #If headless=True, the browser runs in the background (faster for scraping)
-        browser = p.chromium.launch(headless=False)
-        page = browser.new_page(locale="en-GB")
-        page.goto("https://www.google.com/maps", timeout=20000)
-        
-        for search_for_index, search_for in enumerate(search_list):    #this gets you access to the index of each element in a list for i, value in enumerate(my_list):
-            search_for = search_for.strip() # Clean search term
-            print(f"-----\n{search_for_index} - {search_for}")    #the n here is used to go to the next line 
-
-            # Prepare the base filename from the search term
-            base_filename = search_for.replace(' ', '_')         # 'trois et quatre' becomes trois_et_quatre
-
-            # --- NEW: Load existing data and initialize BusinessList ---
-            existing_records = load_existing_data(base_filename, BusinessList.save_at) #that save_at is the jointure of 'GMapsData, today', it is an attribute of the BusinessList
-            initial_count = len(existing_records)
-            business_list = BusinessList(business_list=existing_records)
-
-            # Perform the search
-            page.locator('input[name="q"]').fill(search_for)
-            page.wait_for_timeout(3000)
-            page.keyboard.press("Enter")
-            page.wait_for_timeout(5000)
-            # scrolling
-            page.hover('//a[contains(@href, "https://www.google.com/maps/place")]') #move the mouse cursor over a web element to trigger its hover state (like revealing a dropdown menu or changing its color) without clicking it.
-
-            previously_counted = 0
-            while True:
-                page.mouse.wheel(0, 10000) #literally scrolling the mouse wheel
-                page.wait_for_timeout(3000)
-
-                listings_count = page.locator(
-                    '//a[contains(@href, "https://www.google.com/maps/place")]'
-                ).count()
-                
-                if listings_count >= total:
-                    listings = page.locator(
-                        '//a[contains(@href, "https://www.google.com/maps/place")]'
-                    ).all()[:total] #Playwright method takes the locator and immediately collects a list of all matching elements currently visible in the Document Object Model (DOM)
-                    listings = [listing.locator("xpath=..") for listing in listings]
-                    print(f"Total Scraped: {len(listings)}")
-                    break
-                else:
-                    if listings_count == previously_counted:
-                        listings = page.locator(
-                            '//a[contains(@href, "https://www.google.com/maps/place")]'
-                        ).all()
-                        print(f"Arrived at all available\nTotal Scraped: {len(listings)}")
-                        break
-                    else:
-                        previously_counted = listings_count
-                        print(f"Currently Scraped: {listings_count}", end='\r')
-
-            # NEW: Check if listings is defined and non-empty
-            if 'listings' not in locals() or not listings:
-                print(f"No listings found for {search_for}. Moving to next search.")
-                continue #it basically skips a step of the loop when a condition is equal to the if clause and moves to the next one
-
-            # scraping
-            newly_added_count = 0
-            for listing in listings:
-                try:                        
-                    listing.click()
-                    page.wait_for_timeout(2000)
-
-                    name_attribute = 'h1.DUwDvf'
-                    address_xpath = '//button[@data-item-id="address"]//div[contains(@class, "fontBodyMedium")]'
-                    website_xpath = '//a[@data-item-id="authority"]//div[contains(@class, "fontBodyMedium")]'
-                    phone_number_xpath = '//button[contains(@data-item-id, "phone:tel:")]//div[contains(@class, "fontBodyMedium")]'
-                    review_count_xpath = '//div[@jsaction="pane.reviewChart.moreReviews"]//span'
-                    reviews_average_xpath = '//div[@jsaction="pane.reviewChart.moreReviews"]//div[@role="img"]'
-                    plus_code_xpath = '//button[@data-item-id="oloc"]//div[contains(@class, "fontBodyMedium")]'
-                    business = Business()
-                   
-                    if name_value := page.locator(name_attribute).inner_text():       #this is the walrus operator, which at the same time sets the variable and returns the condition check to the if loop so that it can verify it and continue 
-                        business.name = name_value.strip()
-                    else:
-                        business.name = None
-
-                    if page.locator(address_xpath).count() > 0:
-                        business.address = page.locator(address_xpath).all()[0].inner_text()
-                    else:
-                        business.address = None
-
-                    if page.locator(website_xpath).count() > 0:
-                        business.domain = page.locator(website_xpath).all()[0].inner_text()
-                        business.website = f"https://www.{business.domain}"
-                    else:
-                        business.domain = None
-                        business.website = None
-
-                    if page.locator(phone_number_xpath).count() > 0:
-                        # Clean up the phone number text to ensure hashing works correctly
-                        business.phone_number = page.locator(phone_number_xpath).all()[0].inner_text().strip()
-                    else:
-                        business.phone_number = None
-                        
-                    if page.locator(review_count_xpath).count() > 0:
-                        # Attempt to parse integer, use None on failure
-                        try:
-                            text = page.locator(review_count_xpath).inner_text().split()[0].replace(',', '').strip()
-                            business.reviews_count = int(text)
-                        except:
-                            business.reviews_count = None
-                    else:
-                        business.reviews_count = None
-                        
-                    if page.locator(reviews_average_xpath).count() > 0:
-                        # Attempt to parse float, use None on failure
-                        try:
-                            text = page.locator(reviews_average_xpath).get_attribute('aria-label').split()[0].replace(',', '.').strip()
-                            business.reviews_average = float(text)
-                        except:
-                            business.reviews_average = None
-                    else:
-                        business.reviews_average = None
-                        
-                    if page.locator(plus_code_xpath).count() > 0:
-                        business.plus_code = page.locator(plus_code_xpath).all()[0].inner_text()
-                    else:
-                        business.plus_code = None
-                
-                    #business.category = search_for.split(' in ')[0].strip() if ' in ' in search_for else search_for
-                    #category_xpath = '//button[contains(@aria-label, "Category") or contains(@jsaction, "pane.rating.category") or contains(@data-item-id, "category")]//div'
-                    category_xpath = '//button[contains(@jsaction, "pane.place.category")]//div[contains(@class, "fontBodyMedium")]'
-                    
-                    if page.locator(category_xpath).count() > 0:
-                        # Use the text from the located element
-                        business.category = page.locator(category_xpath).all()[0].inner_text().strip()
-                    else:
-                        # Fallback: Scrape the text from the top element after the name,
-                        # which is often the category if the structured element isn't found.
-                        fallback_category_xpath = '//div[@class="fontBodyMedium"]/span'
-                        if page.locator(fallback_category_xpath).count() > 0:
-                             business.category = page.locator(fallback_category_xpath).all()[0].inner_text().strip()
-                        else:
-                             # Use None if no official category could be found
-                             business.category = None
-                    business.location = search_for.split(' in ')[-1].strip() if ' in ' in search_for else None
-                    #business.latitude, business.longitude = extract_coordinates_from_url(page.url)
-
-                    # NEW: Add business and track if it was new
-                    if business_list.add_business(business):
-                        newly_added_count += 1
-                        
-                except Exception as e:
-                    print(f'Error occurred during scraping: {e}', end='\r')
-            
-            # --- Output (Modified to overwrite existing file with the complete list) ---
-            final_excel_path = os.path.join(BusinessList.save_at, f"{base_filename}.xlsx")
-            final_csv_path = os.path.join(BusinessList.save_at, f"{base_filename}.csv")
-
-            # This will save the full list (old unique + new unique)
-            business_list.dataframe().to_excel(final_excel_path, index=False)
-            business_list.dataframe().to_csv(final_csv_path, index=False)
+    timeouts = dict(DEFAULT_WAIT_TIMEOUTS)
+    for option in args.wait:
+        stage, _, ms = option.partition('=')
+        if stage not in timeouts or not ms.isdigit():
+            parser.error(f"--wait expects STAGE=MS with STAGE in {', '.join(timeouts)}, got '{option}'")
+        timeouts[stage] = int(ms)
+    waits = WaitEngine(timeouts=timeouts, fixed=args.fixed_waits)
 
-            print(f"\n--- Update Summary for '{search_for}' ---")
-            print(f"Records previously saved: {initial_count}")
-            print(f"New unique records added: {newly_added_count}")
-            print(f"Total records in file: {len(business_list.business_list)}")
-            print(f"File updated: {final_csv_path}")
+    if args.restart:
+        for search_for in search_list:
+            store.reset(search_for.replace(' ', '_'))
 
+    plans = {}
+    if args.tiles:
+        if args.max_shards is not None and args.max_shards < 1:
+            parser.error("--max-shards must be at least 1")
+        try:
+            bounds = parse_bounds(args.bbox) if args.bbox else None
+        except ValueError as e:
+            parser.error(str(e))
+        areas = {}
+        if bounds is None:
+            from geopy.geocoders import Nominatim   #only needed to find the area of the searches
+            #every distinct locality once, paced to Nominatim's 1 request per second
+            areas = search_areas(search_list, Nominatim(user_agent="pluscode_decoder"), rate=1.0)
+        for search_for in search_list:
+            search_bounds = bounds or areas.get(search_for)
+            if search_bounds is None:
+                print(f"No area for '{search_for}' (use --bbox or '<what> in <where>'), it is searched without tiles")
+                continue
+            plans[search_for] = ShardPlan(search_bounds, tile_km=args.tile_km, cap=args.tile_cap, max_depth=args.max_depth,
+                                          max_shards=args.max_shards, done=store.done_keys(search_for.replace(' ', '_')))
 
-        browser.close()
+    report = RunReport(args.report, args.prom)
+    try:
+        with profiled(args.profiler, args.profile_output):
+            asyncio.run(run(search_list, total, workers=args.workers, browsers=args.browsers, url=args.url, profile=args.profile, plans=plans,
+                            report=report, waits=waits, engine=args.engine, record_responses=args.record_responses, store=store,
+                            index=index, skip_known=not args.rescrape_known, formats=formats))
+    finally:
+        store.close()
+        index.close()
 
 
 
@@ -313,4 +1050,4 @@ if __name__ == "__main__":
     except Exception as e:
         print(f'Failed err: {e}')
         
-        
\ No newline at end of file
+        
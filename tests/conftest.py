@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the programs import each other by module name (from Storage import ...), as they do when run from WorkingPrograms/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'WorkingPrograms'))
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip('playwright')
+pq = pytest.importorskip('pyarrow.parquet')
+
+import WebScrapingFramework as scraper
+from WebScrapingFramework import Business, BusinessList, ARROW_SCHEMA, BUSINESS_DTYPES
+
+
+def businesses():
+    return BusinessList([
+        Business(name='Caffè Duomo', address='Piazza del Duomo 1', domain='caffeduomo.example', website='https://www.caffeduomo.example',
+                 phone_number='+39 02 0000 0001', category='Cafe', location='Milan', reviews_count=1283, reviews_average=4.4,
+                 latitude=45.4641213, longitude=9.1906831, plus_code='FJ7R+MV Milan'),
+        Business(name='Bar Navigli', category='Bar', reviews_count=87, reviews_average=4.1),
+        Business(name='Senza Recensioni'),
+    ])
+
+
+def test_dataframe_dtypes():
+    df = businesses().dataframe()
+    assert list(df.columns) == list(BUSINESS_DTYPES)
+    assert str(df['reviews_count'].dtype) == 'Int64'
+    for column in ('reviews_average', 'latitude', 'longitude'):
+        assert df[column].dtype == 'float64'
+    for column in ('name', 'address', 'domain', 'website', 'phone_number', 'category', 'location', 'plus_code'):
+        assert isinstance(df[column].dtype, pd.StringDtype)
+    assert df['reviews_count'].tolist() == [1283, 87, pd.NA]
+    assert df['address'].isna().tolist() == [False, True, True]
+
+
+def test_empty_list(tmp_path):
+    df = BusinessList().dataframe()
+    assert len(df) == 0 and list(df.columns) == list(BUSINESS_DTYPES)
+    assert str(df['reviews_count'].dtype) == 'Int64' and df['latitude'].dtype == 'float64'
+    BusinessList().to_parquet(str(tmp_path / 'empty.parquet'))
+    table = pq.read_table(str(tmp_path / 'empty.parquet'))
+    assert table.num_rows == 0 and table.schema.equals(ARROW_SCHEMA)
+
+
+def test_parquet_round_trip(tmp_path):
+    path = str(tmp_path / 'cafes.parquet')
+    businesses().to_parquet(path)
+    table = pq.read_table(path)
+    assert table.schema.equals(ARROW_SCHEMA)
+    pd.testing.assert_frame_equal(pd.read_parquet(path, dtype_backend='numpy_nullable').astype(BUSINESS_DTYPES),
+                                  businesses().dataframe())
+    assert table.column('reviews_count').to_pylist() == [1283, 87, None]
+    assert table.column('name').to_pylist() == ['Caffè Duomo', 'Bar Navigli', 'Senza Recensioni']
+
+
+def test_records_loaded_back_from_csv_export_typed(tmp_path, monkeypatch):
+    monkeypatch.setattr(BusinessList, 'save_at', str(tmp_path))
+    scraper.export_query(businesses(), 'cafes_in_Milan', formats=('csv',))
+    loaded = BusinessList(scraper.load_existing_data('cafes_in_Milan', str(tmp_path)))
+    # pandas reads an integer column with blanks as float: 1283.0
+    assert isinstance(loaded.business_list[0].reviews_count, float)
+    path = scraper.export_query(loaded, 'cafes_in_Milan', formats=('parquet', 'csv'))
+    assert path.endswith('.parquet')
+    table = pq.read_table(path)
+    assert table.schema.field('reviews_count').type == ARROW_SCHEMA.field('reviews_count').type
+    assert table.column('reviews_count').to_pylist() == [1283, 87, None]
+    assert pd.read_csv(str(tmp_path / 'cafes_in_Milan.csv'))['reviews_count'].tolist()[:2] == [1283, 87]
+    assert '1283.0' not in (tmp_path / 'cafes_in_Milan.csv').read_text(encoding='utf-8')   #Int64, not float, in the csv too
+
+
+def test_values_arrow_wont_take_are_coerced(tmp_path):
+    # numbers saved as text, text where a number should be: the column falls back to the forgiving cast
+    odd = BusinessList([Business(name='A', reviews_count='12', reviews_average='n/a', phone_number=390200000001),
+                        Business(name='B', reviews_count=7.9, reviews_average=4)])
+    path = str(tmp_path / 'odd.parquet')
+    odd.to_parquet(path)
+    table = pq.read_table(path)
+    assert table.column('reviews_count').to_pylist() == [12, 7]
+    assert table.column('reviews_average').to_pylist() == [None, 4.0]
+    assert table.column('phone_number').to_pylist() == ['390200000001', None]
+    df = odd.dataframe()
+    assert df['reviews_count'].tolist() == [12, 7] and df['phone_number'].tolist()[0] == '390200000001'
@@ -0,0 +1,127 @@
+import time
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+from GeocodeCache import GeocodeCache, Geocoder, TokenBucket, DAY
+from Location import decode_rows
+
+PLACES = {'Zurich': (47.3769, 8.5417), 'Milan': (45.4642, 9.19)}
+
+
+class FakeGeolocator:
+    """anything with geopy's .geocode: known places, None for the rest, an exception for the ones in failing"""
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def geocode(self, locality):
+        with self.lock:
+            self.calls.append((locality, time.monotonic()))
+        if locality in self.failing:
+            raise TimeoutError(f"service down for {locality}")
+        if locality not in PLACES:
+            return None
+        latitude, longitude = PLACES[locality]
+        return SimpleNamespace(latitude=latitude, longitude=longitude, raw={})
+
+
+def age(cache, locality, seconds):
+    # the entry as if it had been fetched that long ago
+    with cache.connection:
+        cache.connection.execute("UPDATE localities SET fetched_at = ? WHERE locality = ?", (time.time() - seconds, locality))
+
+
+def test_hits_and_misses_expire_after_their_own_ttl(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode.sqlite'), ttl=180 * DAY, negative_ttl=7 * DAY)
+    cache.put('Zurich', PLACES['Zurich'])
+    cache.put('Atlantis')
+    assert cache.get_many(['Zurich', 'Atlantis', 'Milan']) == {'Zurich': PLACES['Zurich'], 'Atlantis': None}
+
+    age(cache, 'Zurich', 8 * DAY)
+    age(cache, 'Atlantis', 8 * DAY)
+    assert cache.get_many(['Zurich', 'Atlantis']) == {'Zurich': PLACES['Zurich']}   #the 'not found' is asked again
+
+    age(cache, 'Zurich', 181 * DAY)
+    assert cache.get_many(['Zurich']) == {}
+    cache.close()
+
+
+def test_expired_entries_are_looked_up_again(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode.sqlite'), ttl=DAY, negative_ttl=DAY)
+    geolocator = FakeGeolocator()
+    geocoder = Geocoder(geolocator, cache, rate=1000)
+    geocoder.resolve(['Zurich', 'Atlantis'])
+    age(cache, 'Zurich', 2 * DAY)
+    assert geocoder.resolve(['Zurich', 'Atlantis']) == {'Zurich': PLACES['Zurich'], 'Atlantis': None}
+    assert [locality for locality, _ in geolocator.calls] == ['Zurich', 'Atlantis', 'Zurich']
+    cache.close()
+
+
+def test_errors_are_not_cached(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode.sqlite'))
+    geocoder = Geocoder(FakeGeolocator(failing={'Milan'}), cache, rate=1000)
+    assert geocoder.resolve(['Milan', 'Atlantis']) == {'Milan': None, 'Atlantis': None}
+    assert geocoder.stats['errors'] == 1 and geocoder.stats['not_found'] == 1
+    assert cache.get_many(['Milan', 'Atlantis']) == {'Atlantis': None}   #only the real answer is kept
+
+    geolocator = FakeGeolocator()
+    assert Geocoder(geolocator, cache, rate=1000).resolve(['Milan', 'Atlantis']) == {'Milan': PLACES['Milan'], 'Atlantis': None}
+    assert [locality for locality, _ in geolocator.calls] == ['Milan']
+    cache.close()
+
+
+def short_codes_frame():
+    # the short codes need their locality as reference, the full one doesn't need any
+    return pd.DataFrame({'plus_code': ['9G8F+6W Zurich', '9G8F+7X Zurich', 'FJ8C+2R Milan', 'FJ8C+3R Milan',
+                                       '9G8F+6W Zurich', '8FVC9G8F+6W']})
+
+
+def test_one_lookup_per_locality_on_a_cold_run_and_none_on_a_warm_one(tmp_path):
+    path = str(tmp_path / 'geocode.sqlite')
+    geolocator = FakeGeolocator()
+    df = short_codes_frame()
+    todo = pd.Series(True, index=df.index)
+    df['latitude'], df['longitude'] = np.nan, np.nan
+    cold = Geocoder(geolocator, GeocodeCache(path), rate=1000)
+    decode_rows(df, todo, geocoder=cold)
+    assert sorted(locality for locality, _ in geolocator.calls) == ['Milan', 'Zurich']
+    assert cold.stats['looked_up'] == 2 and cold.stats['cached'] == 0
+    assert df['latitude'].notna().all()
+    cold.cache.close()
+
+    # a new run (new process, same cache file): everything from the cache, same coordinates
+    geolocator = FakeGeolocator()
+    warm_df = short_codes_frame()
+    warm_df['latitude'], warm_df['longitude'] = np.nan, np.nan
+    warm = Geocoder(geolocator, GeocodeCache(path), rate=1000)
+    decode_rows(warm_df, todo, geocoder=warm)
+    assert geolocator.calls == []
+    assert warm.stats['cached'] == 2
+    pd.testing.assert_frame_equal(warm_df, df)
+    warm.cache.close()
+
+
+def test_lookups_are_paced_by_the_token_bucket(tmp_path):
+    rate = 20.0
+    geolocator = FakeGeolocator()
+    geocoder = Geocoder(geolocator, None, rate=rate, burst=1, workers=4)
+    geocoder.resolve([f'Town {number}' for number in range(6)])
+    times = sorted(moment for _, moment in geolocator.calls)
+    assert len(times) == 6
+    # 4 threads asking at once still get one token every 1/rate seconds (a little slack for the scheduler)
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) >= 0.8 / rate
+    assert times[-1] - times[0] >= 5 * 0.8 / rate
+
+
+def test_token_bucket_allows_its_burst_then_waits():
+    bucket = TokenBucket(rate=10, capacity=3)
+    started = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.08
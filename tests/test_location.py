@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+
+from Location import find_inputs, merge_outputs, batch_locations
+
+
+def write_search(folder, name, rows=2):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name + '.csv')
+    pd.DataFrame({'name': [f'{name} {number}' for number in range(rows)], 'plus_code': ['8FQFF6X9+QQ'] * rows,
+                  'latitude': [45.46] * rows, 'longitude': [9.19] * rows}).to_csv(path, index=False)
+    return path
+
+
+def test_a_previous_merge_is_not_a_search(tmp_path):
+    day = str(tmp_path / '2025-12-01')
+    searches = [write_search(day, 'cafes_in_Milan'), write_search(day, 'bars_in_Milan', rows=3)]
+    merged = str(tmp_path / 'merged.parquet')
+    assert merge_outputs(searches, merged) == 5
+
+    # the next run merges somewhere else: the old merged file must not come back as a search
+    assert find_inputs(str(tmp_path)) == sorted(searches)
+    assert find_inputs(os.path.join(str(tmp_path), '**', '*.parquet')) == []
+
+
+def test_search_parquet_files_are_still_found(tmp_path):
+    day = str(tmp_path / '2025-12-01')
+    csv = write_search(day, 'cafes_in_Milan')
+    parquet = os.path.join(day, 'bars_in_Milan.parquet')
+    pd.read_csv(csv).to_parquet(parquet, index=False)
+    # csv preferred when a search has both, the parquet of a search without a csv is read
+    pd.read_csv(csv).to_parquet(os.path.join(day, 'cafes_in_Milan.parquet'), index=False)
+    assert find_inputs(str(tmp_path)) == sorted([csv, parquet])
+
+
+def write_scraped(folder, name, rows=3):
+    # what the scraper writes with -x csv,parquet: plus codes, no coordinates yet
+    os.makedirs(folder, exist_ok=True)
+    df = pd.DataFrame({'name': [f'{name} {number}' for number in range(rows)], 'plus_code': ['8FQFF6X9+QQ'] * rows})
+    path = os.path.join(folder, name + '.csv')
+    df.to_csv(path, index=False)
+    df.to_parquet(os.path.join(folder, name + '.parquet'), index=False)
+    past = os.path.getmtime(path) - 60
+    os.utime(os.path.join(folder, name + '.parquet'), (past, past))
+    return path
+
+
+def batch(tmp_path, **options):
+    batch_locations(str(tmp_path / 'data'), processes=1, manifest_path=str(tmp_path / 'manifest.json'),
+                    geocoder_options={'cache_path': str(tmp_path / 'geocode.sqlite')}, **options)
+
+
+def test_merge_reads_the_decoded_file_not_an_older_parquet(tmp_path):
+    csv = write_scraped(str(tmp_path / 'data' / '2025-12-01'), 'cafes_in_Milan')
+    merged = str(tmp_path / 'merged.parquet')
+    batch(tmp_path, merge_path=merged)
+    assert pd.read_csv(csv)['latitude'].notna().all()
+    df = pd.read_parquet(merged)
+    assert len(df) == 3
+    assert df['latitude'].notna().all() and df['longitude'].notna().all()
+
+
+def test_outputs_asked_later_are_written_for_unchanged_files(tmp_path):
+    csv = write_scraped(str(tmp_path / 'data' / '2025-12-01'), 'cafes_in_Milan')
+    parquet = os.path.splitext(csv)[0] + '.parquet'
+    os.remove(parquet)
+    batch(tmp_path)
+    assert not os.path.exists(parquet)
+
+    # nothing changed in the csv, but this run wants the parquet too
+    batch(tmp_path, write_parquet=True)
+    assert pd.read_parquet(parquet)['latitude'].notna().all()
+    modified = os.path.getmtime(parquet)
+    batch(tmp_path, write_parquet=True)   #now there's nothing to do
+    assert os.path.getmtime(parquet) == modified
@@ -0,0 +1,157 @@
+import re
+import json
+
+import pytest
+
+from Metrics import RunMetrics, RunReport, time_breakdown
+
+SAMPLE_LINE = re.compile(r'^(gmaps_[a-z_]+)(\{(?:[a-z_]+="(?:[^"\\\n]|\\.)*"(?:,[a-z_]+="(?:[^"\\\n]|\\.)*")*)?\})? (\S+)$')
+
+
+def test_percentiles_and_summary():
+    metrics = RunMetrics()
+    for seconds in range(1, 11):   # 1..10 s, nearest rank percentiles
+        metrics.record('click', float(seconds))
+    with metrics.time('save'):
+        pass
+    stats = metrics.summary()['stages']
+    assert stats['click'] == {'count': 10, 'total': 55.0, 'avg': 5.5, 'p50': 5.0, 'p90': 9.0, 'max': 10.0}
+    assert stats['save']['count'] == 1 and stats['save']['total'] >= 0
+
+
+def test_time_records_also_when_the_block_raises():
+    metrics = RunMetrics()
+    with pytest.raises(RuntimeError):
+        with metrics.time('extract'):
+            raise RuntimeError('pane never opened')
+    assert len(metrics.durations['extract']) == 1
+
+
+def test_counters_and_merge():
+    first, second = RunMetrics(), RunMetrics()
+    first.failure('reviews_count', ValueError('x'))
+    first.failure('reviews_count', ValueError('y'))
+    first.failure('reviews_average', IndexError('z'))
+    first.miss('phone_number')
+    first.error('click', TimeoutError('t'))
+    first.record('click', 1.0)
+    second.failure('reviews_count', ValueError('again'))
+    second.miss('phone_number')
+    second.miss('domain')
+    second.error('click', TimeoutError('t'))
+    second.error('extract', ValueError('v'))
+    second.record('click', 3.0)
+    second.record('scroll', 0.5)
+    first.merge(second)
+    summary = first.summary()
+    assert summary['failures'] == {'reviews_count:ValueError': 3, 'reviews_average:IndexError': 1}
+    assert summary['missing'] == {'phone_number': 2, 'domain': 1}
+    assert summary['errors'] == {'click:TimeoutError': 2, 'extract:ValueError': 1}
+    assert summary['stages']['click']['count'] == 2 and summary['stages']['click']['avg'] == 2.0
+    assert summary['stages']['scroll']['total'] == 0.5
+
+
+def test_time_breakdown():
+    stages = {'harvest': {'total': 1.0}, 'extract': {'total': 2.0}, 'save': {'total': 0.5}, 'export': {'total': 0.25},
+              'click': {'total': 9.0}}
+    waits = {'scroll': {'total': 4.0}, 'click': {'total': 3.0}}
+    assert time_breakdown(stages, waits) == {'waits': 7.0, 'dom': 3.0, 'io': 0.75}
+
+
+def test_parse_fields_counts_missing_and_unparsable_fields():
+    pytest.importorskip('playwright')
+    from WebScrapingFramework import parse_fields, DETAIL_SCHEMA
+    metrics = RunMetrics()
+    raw = {'name': 'Bar Navigli ', 'address': 'Ripa 7', 'domain': None, 'phone_number': None,
+           'reviews_count': 'no reviews', 'reviews_average': '', 'plus_code': 'FJ7R+MV Milan', 'category': 'Bar'}
+    fields = parse_fields(raw, DETAIL_SCHEMA, metrics)
+    assert fields['name'] == 'Bar Navigli' and fields['reviews_count'] is None and fields['reviews_average'] is None
+    assert fields['website'] is None
+    assert metrics.missing == {'domain': 1, 'phone_number': 1}
+    assert metrics.failures == {'reviews_count:ValueError': 1, 'reviews_average:IndexError': 1}
+
+    parse_fields({**raw, 'reviews_count': '1,234 reviews', 'reviews_average': '4,5 stars'}, DETAIL_SCHEMA, metrics)
+    assert metrics.failures == {'reviews_count:ValueError': 1, 'reviews_average:IndexError': 1}
+    assert metrics.missing == {'domain': 2, 'phone_number': 2}
+    with pytest.raises(ValueError):
+        parse_fields({**raw, 'name': None}, DETAIL_SCHEMA, metrics)   # required
+    assert metrics.missing['name'] == 1
+
+
+def search_summary(search, metrics, **counts):
+    return {'search': search, 'listings': 10, 'resumed': 2, 'overlaps': 1, 'seconds': 5.0, 'metrics': metrics,
+            'waits': {'scroll': {'count': 3, 'total': 1.5, 'avg': 0.5, 'max': 0.9, 'fallbacks': 1}}, **counts}
+
+
+def test_run_report_json_lines(tmp_path):
+    report = RunReport(str(tmp_path / 'out' / 'report.jsonl'), None)
+    metrics = RunMetrics()
+    metrics.record('click', 2.0)
+    metrics.failure('reviews_count', ValueError('x'))
+    report.search(search_summary('cafes in Milan', metrics))
+    report.failed('bars in Milan', TimeoutError('page never loaded'))
+    run = report.finish(workers=2)
+    lines = [json.loads(line) for line in (tmp_path / 'out' / 'report.jsonl').read_text(encoding='utf-8').splitlines()]
+    assert [line['type'] for line in lines] == ['search', 'search_failed', 'run']
+    assert len({line['run'] for line in lines}) == 1
+    assert lines[0]['search'] == 'cafes in Milan' and 'metrics' not in lines[0]
+    assert lines[0]['stages']['click']['total'] == 2.0 and lines[0]['failures'] == {'reviews_count:ValueError': 1}
+    assert lines[1]['error'] == 'TimeoutError: page never loaded'
+    assert lines[2]['searches'] == 1 and lines[2]['failed_searches'] == 1 and lines[2]['workers'] == 2
+    assert lines[2]['listings'] == 7   # 10 listings - 2 resumed - 1 found by another tile
+    assert lines[2]['breakdown']['waits'] == 1.5
+    assert run['listings'] == 7 and run['type'] == 'run'
+
+
+def parse_textfile(text):
+    """{metric: {'help': ..., 'type': ..., 'samples': {labels text: value}}}, asserting every line is well formed"""
+    metrics = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            name, help_text = line[len('# HELP '):].split(' ', 1)
+            assert name not in metrics, f"{name} described twice"
+            metrics[name] = {'help': help_text, 'samples': {}}
+        elif line.startswith('# TYPE '):
+            name, kind = line[len('# TYPE '):].split(' ')
+            assert kind in ('counter', 'gauge') and 'type' not in metrics[name]
+            metrics[name]['type'] = kind
+        else:
+            match = SAMPLE_LINE.match(line)
+            assert match, f"bad sample line: {line!r}"
+            name, labels, value = match.group(1), match.group(2) or '', match.group(3)
+            assert 'type' in metrics[name], f"{name} sample before its HELP/TYPE"
+            float(value)
+            metrics[name]['samples'][labels] = float(value)
+    return metrics
+
+
+def test_prometheus_textfile(tmp_path):
+    path = tmp_path / 'run_metrics.prom'
+    report = RunReport(None, str(path))
+    metrics = RunMetrics()
+    metrics.record('click', 2.0)
+    metrics.record('click', 4.0)
+    metrics.failure('reviews_count', ValueError('x'))
+    metrics.failure('reviews_count', ValueError('y'))
+    metrics.miss('phone_number')
+    metrics.error('click', TimeoutError('t'))
+    # a field name with the characters the format has to escape
+    metrics.miss('odd "field"\\name\nsecond line')
+    report.search(search_summary('cafes in Milan', metrics))
+    report.failed('bars in Milan', RuntimeError('boom'))
+
+    assert not (tmp_path / 'run_metrics.prom.tmp').exists()
+    textfile = parse_textfile(path.read_text(encoding='utf-8'))
+    assert textfile['gmaps_stage_seconds_total']['type'] == 'counter'
+    assert textfile['gmaps_stage_seconds_total']['samples'] == {'{stage="click"}': 6.0}
+    assert textfile['gmaps_stage_runs_total']['samples'] == {'{stage="click"}': 2.0}
+    assert textfile['gmaps_stage_seconds_max']['type'] == 'gauge'
+    assert textfile['gmaps_field_failures_total']['samples'] == {'{field="reviews_count",exception="ValueError"}': 2.0}
+    assert textfile['gmaps_field_missing_total']['samples'] == {
+        '{field="phone_number"}': 1.0, '{field="odd \\"field\\"\\\\name\\nsecond line"}': 1.0}
+    assert textfile['gmaps_listing_errors_total']['samples'] == {'{stage="click",exception="TimeoutError"}': 1.0}
+    assert textfile['gmaps_wait_fallbacks_total']['samples'] == {'{stage="scroll"}': 1.0}
+    assert textfile['gmaps_searches_total']['samples'] == {'': 1.0}
+    assert textfile['gmaps_searches_failed_total']['samples'] == {'': 1.0}
+    assert textfile['gmaps_listings_total']['samples'] == {'': 7.0}
+    assert all(metric['help'] for metric in textfile.values())
@@ -0,0 +1,97 @@
+import re
+import random
+
+import numpy as np
+import pytest
+from openlocationcode import openlocationcode as olc
+
+from PlusCodes import decode_batch, verify_against_olc, SHORT_CODE_PATTERN
+
+
+def random_codes(count, seed):
+    """full codes of every length anywhere on earth, and the same codes shortened against a nearby reference"""
+    rng = random.Random(seed)
+    full, short, ref_lat, ref_lng = [], [], [], []
+    for _ in range(count):
+        lat, lng = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        code = olc.encode(lat, lng, rng.choice([10, 11, 12, 13, 15]))
+        full.append(code)
+        # a reference up to ~1 km away, sometimes more, so the nearest match is in the next cell now and then
+        reference = (lat + rng.gauss(0, 0.01), lng + rng.gauss(0, 0.01))
+        shortened = olc.shorten(code, *reference)
+        if shortened != code:
+            short.append(shortened)
+            ref_lat.append(reference[0])
+            ref_lng.append(reference[1])
+    return full, short, np.array(ref_lat), np.array(ref_lng)
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_random_full_and_short_codes_match_the_library(seed):
+    full, short, ref_lat, ref_lng = random_codes(3000, seed)
+    assert decode_batch(full)[2].all()
+    assert verify_against_olc(full) == []
+    assert len(short) > 1000
+    assert decode_batch(short, ref_lat, ref_lng)[2].all()
+    assert verify_against_olc(short, ref_lat, ref_lng) == []
+
+
+def test_short_codes_with_a_far_reference_take_the_nearest_cell():
+    rng = random.Random(3)
+    codes, ref_lat, ref_lng = [], [], []
+    for _ in range(2000):
+        lat, lng = rng.uniform(-80, 80), rng.uniform(-180, 180)
+        code = olc.encode(lat, lng)
+        removed = rng.choice([2, 4, 6])
+        codes.append(code[removed:])
+        span = 20.0 ** (2 - removed / 2)   #the resolution of the missing digits
+        ref_lat.append(lat + rng.uniform(-span, span))
+        ref_lng.append(lng + rng.uniform(-span, span))
+    assert verify_against_olc(codes, np.array(ref_lat), np.array(ref_lng)) == []
+
+
+def test_antimeridian():
+    points = [(10.0, 179.9999), (-33.5, -179.9999), (51.2, 180.0), (0.0, -180.0)]
+    codes = [olc.encode(lat, lng) for lat, lng in points]
+    assert verify_against_olc(codes) == []
+    # short codes whose reference is on the other side of the line
+    short = [code[4:] for code in codes]
+    ref_lat = np.array([lat for lat, _ in points])
+    ref_lng = np.array([-179.999, 179.999, -179.999, 179.999])
+    lat, lng, ok = decode_batch(short, ref_lat, ref_lng)
+    assert ok.all()
+    assert verify_against_olc(short, ref_lat, ref_lng) == []
+    assert ((lng >= -180) & (lng < 180)).all()
+
+
+def test_poles():
+    points = [(90.0, 0.0), (89.99999, 45.0), (-90.0, 10.0), (-89.99999, -120.0)]
+    codes = [olc.encode(lat, lng, length) for lat, lng in points for length in (10, 11, 15)]
+    lat, _, ok = decode_batch(codes)
+    assert ok.all() and (np.abs(lat) <= 90).all()
+    assert verify_against_olc(codes) == []
+    short = [code[4:] for code in codes]
+    ref_lat = np.array([lat for lat, _ in points for _ in range(3)])
+    ref_lng = np.array([lng for _, lng in points for _ in range(3)])
+    assert verify_against_olc(short, ref_lat, ref_lng) == []
+
+
+def test_lowercase_and_blanks_are_accepted():
+    codes = ['8fvc9g8f+6x', ' 8FVC9G8F+6X ', '9g8f+6x']
+    lat, lng, ok = decode_batch(codes, np.array([np.nan, np.nan, 47.4]), np.array([np.nan, np.nan, 8.5]))
+    assert ok.all()
+    expected = olc.decode('8FVC9G8F+6X')
+    assert np.allclose(lat, expected.latitudeCenter) and np.allclose(lng, expected.longitudeCenter)
+
+
+def test_padded_and_invalid_codes_are_left_to_the_library():
+    codes = ['8FVC0000+', '8FVC9G00+', '+', '+9', '8F000000+', 'CFX30000+', 'not a code', '', 'nan', '9G8F+6X']
+    lat, lng, ok = decode_batch(codes)   # the short one has no reference
+    assert not ok.any()
+    assert np.isnan(lat).all() and np.isnan(lng).all()
+    assert verify_against_olc(codes) == []   # nothing decode_batch accepted, nothing to compare
+
+
+@pytest.mark.parametrize('code', ['+', '+9', '+9G', '+9G8FX', '9G+', '9G8F+', '9G8F6X+', '9G8F6X+9', '9G8F+6', '9G8F+6X', '8FVC9G8F+6X'])
+def test_short_code_pattern_agrees_with_the_library(code):
+    assert bool(re.match(SHORT_CODE_PATTERN, code)) == olc.isShort(code)
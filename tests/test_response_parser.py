@@ -0,0 +1,80 @@
+import os
+import json
+
+import pytest
+
+from ResponseParser import parse_response, place_id_from_href, ResponseCollector
+
+# a search response body in the format Maps sends it ('{"c":0,"d":")]}\'\n[...]"}/*""*/'), sanitised:
+# made up place ids, names, phone numbers and domains, and only the positions the parser reads filled in
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'search_response.txt')
+
+
+@pytest.fixture
+def body():
+    with open(FIXTURE, encoding='utf-8') as file:
+        return file.read()
+
+
+def test_parse_response_reads_every_place(body):
+    places = dict(parse_response(body))
+    assert list(places) == ['0x4786c6b3a2f1d001:0x1a2b3c4d5e6f7001', '0x4786c6b3a2f1d002:0x1a2b3c4d5e6f7002',
+                            '0x4786c6b3a2f1d003:0x1a2b3c4d5e6f7003']
+    assert places['0x4786c6b3a2f1d001:0x1a2b3c4d5e6f7001'] == {
+        'name': 'Caffè Duomo',   #trailing space stripped
+        'address': 'Piazza del Duomo, 1, 20121 Milano MI, Italy',
+        'domain': 'caffeduomo.example',
+        'website': 'https://www.caffeduomo.example',
+        'phone_number': '+39 02 0000 0001',
+        'category': 'Coffee shop',
+        'reviews_average': 4.4,
+        'reviews_count': 1283,
+        'latitude': 45.4641213,
+        'longitude': 9.1906831,
+        'plus_code': 'FJ7R+MV Milan, Metropolitan City of Milan, Italy',
+    }
+
+
+def test_missing_fields_are_none(body):
+    places = dict(parse_response(body))
+    no_website = places['0x4786c6b3a2f1d002:0x1a2b3c4d5e6f7002']
+    assert (no_website['domain'], no_website['website'], no_website['phone_number'], no_website['plus_code']) == (None, None, None, None)
+    assert (no_website['reviews_average'], no_website['reviews_count']) == (4.1, 87)
+    no_reviews = places['0x4786c6b3a2f1d003:0x1a2b3c4d5e6f7003']
+    assert (no_reviews['reviews_average'], no_reviews['reviews_count'], no_reviews['category']) == (None, None, None)
+    assert no_reviews['plus_code'] == 'FJ6P+3Q Milan, Metropolitan City of Milan, Italy'
+
+
+def test_the_envelope_is_optional(body):
+    # the same payload without the {"c":..,"d":..} wrapper (the /maps/preview/place responses) parses the same
+    inner = json.loads(body[:-len('/*""*/')])['d']
+    assert parse_response(inner) == parse_response(body)
+
+
+@pytest.mark.parametrize('text', ['', 'not json', ")]}'\n[1, 2", '{"c":0,"d":"garbage"}', '<html></html>'])
+def test_unreadable_bodies_give_nothing(text):
+    assert parse_response(text) == []
+
+
+@pytest.mark.parametrize('href, place_id', [
+    ('https://www.google.com/maps/place/Caff%C3%A8+Duomo/data=!4m7!3m6!1s0x4786c6b3a2f1d001:0x1a2b3c4d5e6f7001'
+     '!8m2!3d45.4641213!4d9.1906831!16s%2Fg%2F11b6d0xyz!19sChIJsanitised?authuser=0&hl=en&rclk=1',
+     '0x4786c6b3a2f1d001:0x1a2b3c4d5e6f7001'),
+    ('/maps/place/Bar+Navigli/data=!4m2!3m1!1s0x4786C6B3A2F1D002:0x1A2B3C4D5E6F7002', '0x4786C6B3A2F1D002:0x1A2B3C4D5E6F7002'),
+    ('https://www.google.com/maps/place/Somewhere/@45.46,9.19,17z', None),
+    ('https://www.google.com/maps/search/cafes/data=!3m1!4b1', None),
+    ('', None),
+    (None, None),
+])
+def test_place_id_from_href(href, place_id):
+    assert place_id_from_href(href) == place_id
+
+
+def test_collector_joins_hrefs_and_responses(body):
+    # what the scraper does: the id in the listing href finds the record of the response
+    collector = ResponseCollector()
+    collector.add_text(body)
+    href = 'https://www.google.com/maps/place/Bar+Navigli/data=!4m7!3m6!1s0x4786c6b3a2f1d002:0x1a2b3c4d5e6f7002!8m2'
+    assert collector.get(place_id_from_href(href))['name'] == 'Bar Navigli'
+    assert collector.get(None) is None
+    assert collector.responses_read == 1
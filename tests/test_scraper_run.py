@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('playwright')
+
+
+def _chromium_launches() -> bool:
+    # the playwright package can be there without its browsers (playwright install chromium)
+    from playwright.sync_api import sync_playwright
+    try:
+        with sync_playwright() as playwright:
+            playwright.chromium.launch(headless=True).close()
+        return True
+    except Exception:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not _chromium_launches(), reason="chromium for playwright is not installed")
+
+import WebScrapingFramework as scraper
+from Benchmark import MapsFixture, make_places, LOCALITY
+from Storage import QueryStore, DedupeIndex
+
+
+def test_run_with_store_and_index_on_the_fixture(tmp_path, monkeypatch):
+    # the same path as the CLI: run() with a store and a dedupe index, against the local Maps stand-in
+    monkeypatch.setattr(scraper.BusinessList, 'save_at', str(tmp_path))
+    store = QueryStore(str(tmp_path / scraper.STORE_FILENAME))
+    index = DedupeIndex(str(tmp_path / 'dedupe_index.sqlite'))
+    search = f"cafes in {LOCALITY}"
+    try:
+        with MapsFixture(make_places(30), latency=10, jitter=0) as fixture:
+            summaries = asyncio.run(scraper.run([search], 30, url=fixture.url, profile='lean',
+                                                waits=scraper.WaitEngine(), store=store, index=index))
+        assert len(summaries) == 1
+        assert summaries[0]['listings'] == 30
+        assert summaries[0]['new'] == 30
+        assert len(store.businesses(search.replace(' ', '_'))) == 30
+        assert len(index) == 30
+    finally:
+        store.close()
+        index.close()
@@ -0,0 +1,41 @@
+import asyncio
+
+from Storage import QueryStore, DedupeIndex
+
+
+def test_query_store_is_usable_from_a_worker_thread(tmp_path):
+    # scrape_query reads the records with asyncio.to_thread(load_query, ...) while the loop thread writes checkpoints
+    store = QueryStore(str(tmp_path / 'store.sqlite'))
+    store.record('cafes_in_Milan', 'place:1', {'name': 'Bar Uno'})
+
+    async def read_in_thread():
+        return await asyncio.to_thread(store.businesses, 'cafes_in_Milan')
+
+    assert asyncio.run(read_in_thread()) == [{'name': 'Bar Uno'}]
+    assert store.done_keys('cafes_in_Milan') == {'place:1'}
+    store.close()
+
+
+def test_checkpoints_survive_reopening(tmp_path):
+    path = str(tmp_path / 'store.sqlite')
+    store = QueryStore(path)
+    store.record('q', '#0', {'name': 'A'})
+    store.record('q', '#1')
+    store.close()
+
+    store = QueryStore(path)
+    assert store.done_keys('q') == {'#0', '#1'}
+    assert store.businesses('q') == [{'name': 'A'}]
+    store.reset('q')
+    assert store.done_keys('q') == set()
+    store.close()
+
+
+def test_dedupe_index_by_fingerprint_and_place_id(tmp_path):
+    index = DedupeIndex(str(tmp_path / 'index.sqlite'))
+    fields = {'name': 'Bar Uno', 'phone_number': '+39 02 1234567'}
+    assert index.add(fields, query='cafes', place_id='0x1:0x2') is True
+    assert index.add(dict(fields), query='coffee') is False
+    assert index.get('place:0x1:0x2') == fields
+    assert len(index) == 1
+    index.close()
@@ -0,0 +1,98 @@
+import time
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from Tiling import Tile, ShardPlan, parse_bounds, plan_tiles, simulate, search_term, search_areas
+
+MILAN = '45.38,9.04,45.54,9.28'
+
+
+def clustered_places(bounds: Tile, count: int, seed: int = 0) -> list[tuple]:
+    rng = random.Random(seed)
+    lat, lng = bounds.center
+    return [(min(max(rng.gauss(lat, (bounds.north - bounds.south) / 6), bounds.south), bounds.north - 1e-9),
+             min(max(rng.gauss(lng, (bounds.east - bounds.west) / 6), bounds.west), bounds.east - 1e-9))
+            for _ in range(count)]
+
+
+def test_grid_covers_the_bounds_without_overlaps():
+    bounds = parse_bounds(MILAN)
+    grid = plan_tiles(bounds, 2.0)
+    points = clustered_places(bounds, 2000)
+    for lat, lng in points:
+        assert sum(tile.contains(lat, lng) for tile in grid) == 1
+
+
+def test_split_quadrants_and_zoom():
+    tile = Tile(45.0, 9.0, 45.1, 9.2)
+    children = tile.split()
+    assert len(children) == 4 and all(child.depth == 1 for child in children)
+    assert all(child.zoom() >= tile.zoom() for child in children)
+    assert tile.url('pizza places', 'http://127.0.0.1:8000/maps').startswith('http://127.0.0.1:8000/maps/search/pizza+places/@45.050000,9.100000,')
+    assert search_term('restaurants in Milan') == 'restaurants'
+
+
+def test_saturated_tiles_are_split_until_everything_is_found():
+    bounds = parse_bounds(MILAN)
+    plan = ShardPlan(bounds, max_depth=6)
+    places = clustered_places(bounds, 20000)
+    assert len(simulate(plan, places)) == len(places)
+    assert plan.stats['split'] > 0 and plan.complete
+
+
+@pytest.mark.parametrize('max_shards', [1, 20, 100])
+def test_max_shards_bounds_the_tiles_scraped(max_shards):
+    bounds = parse_bounds(MILAN)
+    plan = ShardPlan(bounds, tile_km=2.0, max_shards=max_shards)
+    simulate(plan, clustered_places(bounds, 5000))
+    assert plan.stats['planned'] <= max_shards
+    assert plan.stats['scraped'] <= max_shards
+
+
+def test_resume_plans_only_the_missing_tiles():
+    bounds = parse_bounds(MILAN)
+    places = clustered_places(bounds, 20000, seed=1)
+    plan = ShardPlan(bounds, max_depth=6)
+    queue, done = plan.initial(), set()
+    for _ in range(100):   # the first run stops after 100 tiles
+        tile = queue.pop()
+        inside = [place for place in places if tile.contains(*place)][:plan.cap]
+        checkpoint, children = plan.finished(tile, len(inside))
+        done.add(checkpoint)
+        queue.extend(children)
+
+    resumed = ShardPlan(bounds, max_depth=6, done=done).initial()
+    assert sorted(tile.key for tile in resumed) == sorted(tile.key for tile in queue)
+
+
+def test_failed_tiles_are_not_checkpointed():
+    plan = ShardPlan(parse_bounds(MILAN))
+    tile = plan.initial()[0]
+    assert plan.finished(tile, None) == (None, [])
+    assert plan.stats['failed'] == 1
+
+
+class FakeNominatim:
+    def __init__(self):
+        self.calls = []
+
+    def geocode(self, locality):
+        self.calls.append((locality, time.monotonic()))
+        if locality == 'Nowhere':
+            return None
+        if locality == 'Broken':
+            raise TimeoutError('service down')
+        return SimpleNamespace(raw={'boundingbox': ['45.38', '45.54', '9.04', '9.28']})
+
+
+def test_search_areas_asks_each_locality_once_and_paced():
+    geolocator = FakeNominatim()
+    searches = ['cafes in Milan', 'bars in Milan', 'gyms in Nowhere', 'pizza', 'shops in Broken', 'bakeries in Milan']
+    areas = search_areas(searches, geolocator, rate=20)
+    assert [locality for locality, _ in geolocator.calls] == ['Milan', 'Nowhere', 'Broken']
+    assert areas['cafes in Milan'] == areas['bakeries in Milan'] == parse_bounds(MILAN)
+    assert areas['gyms in Nowhere'] is None and areas['pizza'] is None and areas['shops in Broken'] is None
+    times = [moment for _, moment in geolocator.calls]
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) >= 0.8 / 20